@@ -0,0 +1,248 @@
+"""
+Vectorized Pong for Ultra!Pong HDR: N independent matches stepped at once with NumPy.
+
+BatchPongSim applies the same rules as pongsim.PongSim, but keeps the state of
+every match in structure-of-arrays buffers (one array per field, one element
+per match) and writes collisions, reflections, clamps and scoring as masked
+array operations. One step() call advances every match, which is what AI
+tuning runs need to get through millions of rallies.
+"""
+import numpy as np
+
+from pongsim import (SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_MARGIN,
+                     BALL_RADIUS, AI_PADDLE_SPEED, BALL_SPEED_X_INITIAL, BALL_SPEED_Y_INITIAL,
+                     WINNING_SCORE, PADDLE_HIT_SPEED_INCREASE_FACTOR, MAX_ABS_BALL_SPEED_X,
+                     PADDLE_BOUNCE_ANGLE_FACTOR, MAX_ABS_BALL_SPEED_Y,
+                     EVENT_PADDLE_HIT, EVENT_WALL_HIT, EVENT_SCORE, EVENT_GAME_OVER,
+                     MAX_SWEEP_EVENTS, INF, KIND_PLAYER_PADDLE, KIND_AI_PADDLE, KIND_WALL, KIND_GOAL)
+
+BALL_SIZE = BALL_RADIUS * 2
+PLAYER_PADDLE_X = PADDLE_MARGIN
+AI_PADDLE_X = SCREEN_WIDTH - PADDLE_MARGIN - PADDLE_WIDTH
+BALL_START_X = SCREEN_WIDTH / 2 - BALL_SIZE / 2
+BALL_START_Y = SCREEN_HEIGHT / 2 - BALL_SIZE / 2
+PADDLE_START_Y = SCREEN_HEIGHT / 2 - PADDLE_HEIGHT / 2
+
+# Values of BatchPongSim.winner
+WINNER_NONE = 0
+WINNER_PLAYER = 1
+WINNER_AI = 2
+
+
+def _sweep_aabb(x, y, vx, vy, xmin, xmax, ymin, ymax, limit):
+    """Vectorized pongsim.sweep_aabb: per-element time of impact in [0, limit), INF where there is none."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tx1 = (xmin - x) / vx
+        tx2 = (xmax - x) / vx
+        ty1 = (ymin - y) / vy
+        ty2 = (ymax - y) / vy
+    inside_x = (xmin < x) & (x < xmax)
+    inside_y = (ymin < y) & (y < ymax)
+    # A zero velocity component either never constrains the time or rules the hit out entirely
+    tx_enter = np.where(vx == 0, np.where(inside_x, -INF, INF), np.minimum(tx1, tx2))
+    tx_exit = np.where(vx == 0, np.where(inside_x, INF, -INF), np.maximum(tx1, tx2))
+    ty_enter = np.where(vy == 0, np.where(inside_y, -INF, INF), np.minimum(ty1, ty2))
+    ty_exit = np.where(vy == 0, np.where(inside_y, INF, -INF), np.maximum(ty1, ty2))
+    t_enter = np.maximum(np.maximum(tx_enter, ty_enter), 0.0)
+    t_exit = np.minimum(np.minimum(tx_exit, ty_exit), limit)
+    return np.where(t_enter < t_exit, t_enter, INF)
+
+
+def _sweep_paddle(x, y, vx, vy, paddle_y, paddle_x, limit):
+    """Time of impact of each ball, with its top-left corner at (x, y), against a paddle column."""
+    return _sweep_aabb(x, y, vx, vy, paddle_x - BALL_SIZE, paddle_x + PADDLE_WIDTH,
+                       paddle_y - BALL_SIZE, paddle_y + PADDLE_HEIGHT, limit)
+
+
+def _time_to_bounds(pos, speed, low, high, limit):
+    """Vectorized pongsim._time_to_bounds."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(speed < 0, (low - pos) / speed, (high - pos) / speed)
+    t = np.maximum(t, 0.0)
+    return np.where((speed == 0) | (t > limit), INF, t)
+
+
+class BatchPongSim:
+    """
+    N Pong matches in structure-of-arrays form.
+    Positions are the top-left corners of the ball and paddles (the paddles' x never changes).
+    Args:
+        n (int): Number of matches.
+        seed: Seed for the numpy Generator that picks serve directions.
+    """
+
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.ball_x = np.full(n, BALL_START_X, dtype=np.float64)
+        self.ball_y = np.full(n, BALL_START_Y, dtype=np.float64)
+        self.ball_vx = np.full(n, BALL_SPEED_X_INITIAL, dtype=np.float64)
+        self.ball_vy = np.full(n, BALL_SPEED_Y_INITIAL, dtype=np.float64)
+        self.player_y = np.full(n, PADDLE_START_Y, dtype=np.float64)
+        self.ai_y = np.full(n, PADDLE_START_Y, dtype=np.float64)
+        self.player_score = np.zeros(n, dtype=np.int32)
+        self.ai_score = np.zeros(n, dtype=np.int32)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.winner = np.zeros(n, dtype=np.int8)
+        self.events = np.zeros(n, dtype=np.uint8)
+
+    def _coin(self, count):
+        """count fair coin flips, as a bool array."""
+        return self.rng.random(count) < 0.5
+
+    def _serve(self, mask, to_player):
+        """Centers the ball for matches in mask and serves toward +x where to_player is True."""
+        self.ball_x[mask] = BALL_START_X
+        self.ball_y[mask] = BALL_START_Y
+        self.ball_vx[mask] = np.where(to_player[mask], BALL_SPEED_X_INITIAL, -BALL_SPEED_X_INITIAL)
+        self.ball_vy[mask] = np.where(self._coin(np.count_nonzero(mask)), BALL_SPEED_Y_INITIAL, -BALL_SPEED_Y_INITIAL)
+
+    def reset(self, mask=None):
+        """Resets the matches selected by the bool array mask (all matches if None)."""
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        self.player_score[mask] = 0
+        self.ai_score[mask] = 0
+        self.game_over[mask] = False
+        self.winner[mask] = WINNER_NONE
+        self.player_y[mask] = PADDLE_START_Y
+        self.ai_y[mask] = PADDLE_START_Y
+        to_player = np.zeros(self.n, dtype=bool)
+        to_player[mask] = self._coin(np.count_nonzero(mask))
+        self._serve(mask, to_player)
+
+    def step(self, player_y, ai_y=None, dt=1.0):
+        """
+        Advances every match that is not over by dt ticks, sweeping the ball like PongSim.step().
+        Args:
+            player_y (array | float): Requested center y of each player paddle.
+            ai_y (array | float | None): Center y each AI paddle should move toward; None follows the ball.
+            dt (float): Length of the step in ticks.
+        Returns:
+            np.ndarray: Per-match EVENT_* bit flags (uint8), reused between calls.
+        """
+        active = ~self.game_over
+        vx, vy = self.ball_vx, self.ball_vy
+        events = self.events
+        events[:] = 0
+
+        # --- Ball Movement ---
+        # Each pass moves every pending match to its earliest collision and responds to it.
+        x = self.ball_x.copy()
+        y = self.ball_y.copy()
+        remaining = np.where(active, float(dt), 0.0)
+        pending = active.copy()
+        hit_paddle = np.zeros(self.n, dtype=bool)
+        goal = np.zeros(self.n, dtype=bool)
+        for _ in range(MAX_SWEEP_EVENTS):
+            if not pending.any():
+                break
+            t_player = _sweep_paddle(x, y, vx, vy, self.player_y, PLAYER_PADDLE_X, remaining)
+            t_ai = _sweep_paddle(x, y, vx, vy, self.ai_y, AI_PADDLE_X, remaining)
+            t_wall = _time_to_bounds(y, vy, 0, SCREEN_HEIGHT - BALL_SIZE, remaining)
+            t_goal = _time_to_bounds(x, vx, 0, SCREEN_WIDTH - BALL_SIZE, remaining)
+            # Earliest event wins; ties go to paddle, then wall, then goal, as in PongSim
+            kind = np.full(self.n, KIND_PLAYER_PADDLE, dtype=np.int8)
+            t_hit = t_player
+            for t, k in ((t_ai, KIND_AI_PADDLE), (t_wall, KIND_WALL), (t_goal, KIND_GOAL)):
+                earlier = t < t_hit
+                kind[earlier] = k
+                t_hit = np.where(earlier, t, t_hit)
+
+            free = pending & (t_hit == INF)
+            x[free] += vx[free] * remaining[free]
+            y[free] += vy[free] * remaining[free]
+            pending &= ~free
+            x[pending] += vx[pending] * t_hit[pending]
+            y[pending] += vy[pending] * t_hit[pending]
+            remaining[pending] -= t_hit[pending]
+
+            at_goal = pending & (kind == KIND_GOAL)
+            x[at_goal] = np.where(vx[at_goal] < 0, 0.0, SCREEN_WIDTH - BALL_SIZE)  # Exactly on the goal line
+            goal |= at_goal
+            pending &= ~at_goal
+
+            wall = pending & (kind == KIND_WALL)
+            y[wall] = np.where(vy[wall] < 0, 0.0, SCREEN_HEIGHT - BALL_SIZE)  # Exactly on the wall
+            vy[wall] *= -1
+            events[wall & ~hit_paddle] |= EVENT_WALL_HIT
+
+            # --- Paddle Collision and Response ---
+            hit_player = pending & (kind == KIND_PLAYER_PADDLE)
+            hit_ai = pending & (kind == KIND_AI_PADDLE)
+            hit = hit_player | hit_ai
+            hit_paddle |= hit
+            x[hit_player] = PLAYER_PADDLE_X + PADDLE_WIDTH  # Flush with the paddle face
+            x[hit_ai] = AI_PADDLE_X - BALL_SIZE
+            new_abs_vx = np.minimum(np.abs(vx) * PADDLE_HIT_SPEED_INCREASE_FACTOR, MAX_ABS_BALL_SPEED_X)
+            vx[hit_player] = new_abs_vx[hit_player]
+            vx[hit_ai] = -new_abs_vx[hit_ai]
+            paddle_y = np.where(hit_player, self.player_y, self.ai_y)
+            normalized_delta_y = ((y + BALL_SIZE / 2) - (paddle_y + PADDLE_HEIGHT / 2)) / (PADDLE_HEIGHT / 2)
+            new_vy = normalized_delta_y * BALL_SPEED_Y_INITIAL * PADDLE_BOUNCE_ANGLE_FACTOR
+            abs_vy = np.abs(new_vy)
+            new_vy = np.where(abs_vy > MAX_ABS_BALL_SPEED_Y, np.copysign(MAX_ABS_BALL_SPEED_Y, new_vy),
+                              np.where((abs_vy > 0) & (abs_vy < 1.0), np.copysign(1.0, new_vy), new_vy))
+            vy[hit] = new_vy[hit]
+        events[hit_paddle] |= EVENT_PADDLE_HIT
+
+        # --- Scoring ---
+        ai_point = goal & (x <= 0)
+        player_point = goal & ~ai_point
+        rally = active & ~goal
+        self.ball_x[rally] = x[rally]
+        self.ball_y[rally] = y[rally]
+        self.ai_score += ai_point
+        self.player_score += player_point
+        events[goal] |= EVENT_SCORE
+
+        ai_wins = ai_point & (self.ai_score >= WINNING_SCORE)
+        player_wins = player_point & (self.player_score >= WINNING_SCORE)
+        won = ai_wins | player_wins
+        self.game_over |= won
+        self.winner[ai_wins] = WINNER_AI
+        self.winner[player_wins] = WINNER_PLAYER
+        events[won] |= EVENT_GAME_OVER
+        self.ball_x[won] = BALL_START_X  # Just center the ball visually and stop it
+        self.ball_y[won] = BALL_START_Y
+        vx[won] = 0.0
+        vy[won] = 0.0
+        # The player serves after the AI scores, and vice versa
+        self._serve(goal & ~won, ai_point)
+
+        # --- Player Paddle Control ---
+        new_player_y = np.clip(np.asarray(player_y, dtype=np.float64) - PADDLE_HEIGHT / 2,
+                               0, SCREEN_HEIGHT - PADDLE_HEIGHT)
+        self.player_y[:] = np.where(active, new_player_y, self.player_y)
+
+        # --- AI Paddle Control ---
+        # Move toward the target at AI_PADDLE_SPEED, with a small deadzone. The simple AI targets the ball.
+        # A move never passes the target, so coarse steps don't overshoot and oscillate around it.
+        target_y = self.ball_y + BALL_SIZE / 2 if ai_y is None else np.asarray(ai_y, dtype=np.float64)
+        distance = target_y - (self.ai_y + PADDLE_HEIGHT / 2)
+        max_move = AI_PADDLE_SPEED * dt
+        move = np.where(np.abs(distance) > AI_PADDLE_SPEED / 2, np.clip(distance, -max_move, max_move), 0.0)
+        new_ai_y = self.ai_y + move
+        self.ai_y[:] = np.where(active, np.clip(new_ai_y, 0, SCREEN_HEIGHT - PADDLE_HEIGHT), self.ai_y)
+
+        return events
+
+
+def predict_crossing_y(x, y, vx, vy, plane_x, max_y=SCREEN_HEIGHT - BALL_SIZE):
+    """
+    Vectorized pongsim.predict_crossing: per-match ticks until x reaches plane_x and the top-left
+    y there, with wall bounces folded in. Time is INF (and y is the current y) where the ball is moving away.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (plane_x - x) / vx
+    heading = (vx != 0) & (t >= 0)
+    t = np.where(heading, t, INF)
+    period = 2.0 * max_y
+    folded = np.mod(np.where(heading, y + vy * np.where(heading, t, 0.0), y), period)
+    return t, np.where(folded > max_y, period - folded, folded)
+
+
+def predictive_ai_target(sim):
+    """Per-match center y for BatchPongSim.step(ai_y=...) that meets the ball at the AI paddle face."""
+    t, y = predict_crossing_y(sim.ball_x, sim.ball_y, sim.ball_vx, sim.ball_vy, AI_PADDLE_X - BALL_SIZE)
+    return np.where(t == INF, SCREEN_HEIGHT / 2, y + BALL_SIZE / 2)
@@ -0,0 +1,292 @@
+"""
+Benchmarks for Ultra!Pong HDR.
+
+Measures simulation throughput, frame drawing on the SDL dummy video driver, sound
+synthesis latency, startup time to the first frame and frame pacing jitter. Results are written as JSON,
+and can be compared against a stored baseline to catch regressions:
+
+    python pongbench.py --output baseline.json
+    python pongbench.py --compare baseline.json      # exits with status 1 on a regression
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10  # Relative slowdown that counts as a regression
+SIM_STEPS = 100_000
+BATCH_SIZE = 4096
+BATCH_STEPS = 200
+DRAW_FRAMES = 2000
+WAVE_CALLS = 200
+STARTUP_RUNS = 3
+PACING_FRAMES = 300
+# Reported, but never counted as regressions: frame pacing jitter mostly measures the OS scheduler
+UNGATED_PREFIXES = ('pacing.',)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _headless_environment(env=os.environ):
+    """Points SDL at its dummy drivers, unless the caller chose drivers already."""
+    env.setdefault('SDL_VIDEODRIVER', 'dummy')
+    env.setdefault('SDL_AUDIODRIVER', 'dummy')
+    env.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    return env
+
+
+def _best_rate(repeat, count, run):
+    """Runs run() `repeat` times and returns the best rate, in count per second."""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def _player_inputs(count):
+    """A deterministic sweep of mouse y values."""
+    return [200 + 180 * math.sin(i * 0.013) for i in range(count)]
+
+
+# --- Benchmarks ---
+# Each returns {metric: (value, unit, higher_is_better)}.
+def bench_sim(repeat):
+    """Rules steps per second, as driven by update_game_state(), and the vectorized equivalent."""
+    from pongsim import PongSim, EVENT_GAME_OVER
+    inputs = _player_inputs(SIM_STEPS)
+    sim = PongSim(1)
+
+    def run():
+        sim.reset_game(1)
+        step = sim.step
+        for player_y in inputs:
+            if step(player_y) & EVENT_GAME_OVER:
+                sim.reset_game()
+
+    results = {'sim.steps_per_s': (_best_rate(repeat, SIM_STEPS, run), 'steps/s', True)}
+    try:
+        import numpy as np
+        from pongbatch import BatchPongSim
+    except ImportError:
+        return results
+    batch = BatchPongSim(BATCH_SIZE, seed=1)
+    player_y = np.full(BATCH_SIZE, 200.0)
+
+    def run_batch():
+        batch.reset()
+        for _ in range(BATCH_STEPS):
+            batch.step(player_y)
+            if batch.game_over.any():
+                batch.reset(batch.game_over)
+
+    results['sim.batch_match_steps_per_s'] = (_best_rate(repeat, BATCH_SIZE * BATCH_STEPS, run_batch), 'steps/s', True)
+    return results
+
+
+def bench_draw(repeat):
+    """draw_elements() and draw_elements_dirty() frames per second on the SDL dummy driver."""
+    _headless_environment()
+    import ponghdrv0 as game
+    game.App().start()
+    game.reset_game()
+    inputs = _player_inputs(DRAW_FRAMES)
+
+    def frames(draw):
+        def run():
+            for player_y in inputs:
+                game.sim.step(player_y)
+                if game.sim.game_over:
+                    game.reset_game()
+                game.sync_rects()
+                draw()
+        return run
+
+    game.invalidate_dirty_rects()
+    return {
+        'draw.frames_per_s': (_best_rate(repeat, DRAW_FRAMES, frames(game.draw_elements)), 'frames/s', True),
+        'draw.dirty_frames_per_s': (_best_rate(repeat, DRAW_FRAMES, frames(game.draw_elements_dirty)), 'frames/s', True),
+    }
+
+
+def bench_audio(repeat):
+    """Sound synthesis latency for a score-length effect, per wave type. Needs numpy, but not PyAudio."""
+    _headless_environment()
+    import ponghdrv0 as game
+    try:
+        game.import_numpy()
+    except ImportError:
+        return {}  # Nothing to synthesize with
+    results = {}
+    for wave_type in ('sine', 'square', 'sawtooth'):
+        def run():
+            for _ in range(WAVE_CALLS):
+                game.synthesize_wave(880, game.DURATION_SCORE, 0.3, wave_type)
+        rate = _best_rate(repeat, WAVE_CALLS, run)
+        results[f'audio.{wave_type}_wave_ms'] = (1000.0 / rate, 'ms', False)
+    return results
+
+
+_FIRST_FRAME_SCRIPT = """
+import sys, time
+sys.path.insert(0, {here!r})
+start = time.perf_counter()
+import ponghdrv0 as game
+import_seconds = time.perf_counter() - start
+app = game.App()
+app.start()
+app.shutdown()
+print(import_seconds, app.first_frame_time)
+"""
+
+
+def bench_startup(repeat):
+    """
+    Wall time from launching a fresh interpreter to the first frame (the main menu) being
+    presented, and the time taken by `import ponghdrv0` alone.
+    """
+    env = _headless_environment(dict(os.environ))
+    script = _FIRST_FRAME_SCRIPT.format(here=HERE)
+    import_times = []
+    first_frame_times = []
+    for _ in range(max(repeat, STARTUP_RUNS)):
+        start = time.time()
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+        import_seconds, first_frame_time = output.stdout.split()[-2:]
+        import_times.append(float(import_seconds) * 1000.0)
+        first_frame_times.append((float(first_frame_time) - start) * 1000.0)
+    return {'startup.import_ms': (statistics.median(import_times), 'ms', False),
+            'startup.first_frame_ms': (statistics.median(first_frame_times), 'ms', False)}
+
+
+def bench_pacing(repeat):
+    """
+    Frame interval jitter (standard deviation, in ms) of each timer-based FRAME_PACING strategy,
+    at the game's RENDER_FPS with no frame work; the median of `repeat` runs of PACING_FRAMES frames.
+    vsync needs a real display, so it isn't measured.
+    """
+    _headless_environment()
+    import ponghdrv0 as game
+    game.import_pygame()
+    results = {}
+    for strategy in ('sleep', 'busy', 'hybrid'):
+        jitters = []
+        deviations = []
+        for _ in range(repeat):
+            pacer = game.FramePacer(strategy, game.RENDER_FPS, game.pygame.time.Clock())
+            for _ in range(PACING_FRAMES):
+                pacer.wait()
+            stats = pacer.stats()
+            jitters.append(stats['stdev_ms'])
+            deviations.append(stats['p99_deviation_ms'])
+        results[f'pacing.{strategy}_jitter_ms'] = (statistics.median(jitters), 'ms', False)
+        results[f'pacing.{strategy}_p99_deviation_ms'] = (statistics.median(deviations), 'ms', False)
+    return results
+
+
+BENCHMARKS = {
+    'sim': bench_sim,
+    'draw': bench_draw,
+    'audio': bench_audio,
+    'startup': bench_startup,
+    'pacing': bench_pacing,
+}
+
+
+def run_benchmarks(names=None, repeat=DEFAULT_REPEAT):
+    """
+    Runs the selected benchmarks.
+    Returns:
+        dict: JSON-ready {'meta': {...}, 'results': {metric: {'value', 'unit', 'higher_is_better'}}}.
+    """
+    results = {}
+    names = list(names or BENCHMARKS)
+    for name in names:
+        for metric, (value, unit, higher_is_better) in BENCHMARKS[name](repeat).items():
+            results[metric] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+    try:
+        import pygame
+        pygame_version = pygame.version.ver
+    except ImportError:
+        pygame_version = None
+    meta = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame_version,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'benchmarks': names,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares two run_benchmarks() reports. A baseline metric from a benchmark that ran but
+    didn't produce it (e.g. because a dependency went missing) counts as a regression too.
+    Metrics matching UNGATED_PREFIXES are listed but never count.
+    Returns:
+        tuple: (lines of a text table, list of regressed metric names)
+    """
+    lines = [f"{'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}"]
+    regressions = []
+    for metric, result in current['results'].items():
+        base = baseline['results'].get(metric)
+        if base is None or not base['value']:
+            lines.append(f"{metric:<32} {'-':>12} {result['value']:12.4g} {'new':>8}")
+            continue
+        change = result['value'] / base['value'] - 1.0
+        # A regression is a drop in a higher-is-better metric or a rise in a lower-is-better one
+        slowdown = -change if result['higher_is_better'] else change
+        flag = ''
+        if metric.startswith(UNGATED_PREFIXES):
+            flag = '  (not gated)'
+        elif slowdown > threshold:
+            regressions.append(metric)
+            flag = '  REGRESSION'
+        lines.append(f"{metric:<32} {base['value']:12.4g} {result['value']:12.4g} {change:+8.1%}{flag}")
+    ran = current['meta'].get('benchmarks')
+    for metric, base in baseline['results'].items():
+        if (metric not in current['results'] and not metric.startswith(UNGATED_PREFIXES)
+                and (ran is None or metric.split('.')[0] in ran)):
+            regressions.append(metric)
+            lines.append(f"{metric:<32} {base['value']:12.4g} {'-':>12} {'missing':>8}  REGRESSION")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, rendering, audio synthesis, startup and frame pacing.")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="runs per benchmark; the best is kept")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare with a stored results file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.only, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            lines, regressions = compare(report, json.load(baseline_file), args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        return 0
+    if not args.output:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Reinforcement-learning environment for Ultra!Pong HDR.
+
+PongVectorEnv runs N matches as one vectorized environment with a gym-style
+reset()/step(actions) API. The agent controls the player (left) paddle and the
+opponent is one of the built-in AIs. Matches that end are reset automatically.
+
+All outputs are written into arrays allocated once. step() returns the same
+observation, reward and done arrays every call, so copy them if you need to keep
+them. With workers > 0, the matches are split across subprocesses. Each worker
+steps its slice of a BatchPongSim and writes straight into one
+multiprocessing.shared_memory block. Only a one-byte command crosses the pipe
+per step, so nothing is pickled.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pongsim import (SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_HEIGHT, AI_PADDLE_SPEED,
+                     MAX_ABS_BALL_SPEED_X, MAX_ABS_BALL_SPEED_Y)
+from pongbatch import BatchPongSim, predictive_ai_target
+
+# Actions: keep still, move up, move down (at the AI paddle's speed)
+ACTION_STAY = 0
+ACTION_UP = 1
+ACTION_DOWN = 2
+NUM_ACTIONS = 3
+ACTION_MOVES = np.array([0.0, -1.0, 1.0])
+
+# Observation per match, each scaled to about [-1, 1]:
+# ball x, ball y, ball vx, ball vy, player paddle y, AI paddle y
+OBSERVATION_SIZE = 6
+OPPONENTS = ('follow', 'predictive')
+
+# Worker commands
+_CMD_RESET = b'r'
+_CMD_STEP = b's'
+_CMD_CLOSE = b'c'
+
+
+def _shared_layout(n):
+    """Byte offsets of the actions, observations, rewards and dones arrays in a shared block, and its size."""
+    offsets = {}
+    size = 0
+    for name, dtype, count in (('obs', np.float32, n * OBSERVATION_SIZE), ('rewards', np.float32, n),
+                               ('actions', np.int8, n), ('dones', np.bool_, n)):
+        offsets[name] = size
+        size += -(-count * np.dtype(dtype).itemsize // 8) * 8  # Keep every array 8-byte aligned
+    return offsets, size
+
+
+def _shared_arrays(buffer, n):
+    """NumPy views of (actions, obs, rewards, dones) over a shared block laid out by _shared_layout()."""
+    offsets, _ = _shared_layout(n)
+    actions = np.ndarray((n,), np.int8, buffer, offsets['actions'])
+    obs = np.ndarray((n, OBSERVATION_SIZE), np.float32, buffer, offsets['obs'])
+    rewards = np.ndarray((n,), np.float32, buffer, offsets['rewards'])
+    dones = np.ndarray((n,), np.bool_, buffer, offsets['dones'])
+    return actions, obs, rewards, dones
+
+
+class _EnvSlice:
+    """
+    The matches of one process: a BatchPongSim writing its results into slices of the env's
+    output arrays (plain arrays in-process, shared-memory views in a worker).
+    """
+
+    def __init__(self, obs, rewards, dones, opponent, dt, seed):
+        self.sim = BatchPongSim(len(rewards), seed)
+        self.obs = obs
+        self.rewards = rewards
+        self.dones = dones
+        self.opponent = opponent
+        self.dt = dt
+        self.last_player_score = np.zeros(len(rewards), dtype=np.int32)
+        self.last_ai_score = np.zeros(len(rewards), dtype=np.int32)
+
+    def reset(self):
+        self.sim.reset()
+        self.last_player_score[:] = 0
+        self.last_ai_score[:] = 0
+        self.rewards[:] = 0.0
+        self.dones[:] = False
+        self._observe()
+
+    def step(self, actions):
+        sim = self.sim
+        player_y = sim.player_y + PADDLE_HEIGHT / 2 + ACTION_MOVES[actions] * (AI_PADDLE_SPEED * self.dt)
+        ai_y = predictive_ai_target(sim) if self.opponent == 'predictive' else None
+        sim.step(player_y, ai_y, self.dt)
+        # +1 for every point the agent wins, -1 for every point it loses
+        np.subtract(sim.player_score, self.last_player_score, out=self.rewards, casting='unsafe')
+        self.rewards -= sim.ai_score - self.last_ai_score
+        self.last_player_score[:] = sim.player_score
+        self.last_ai_score[:] = sim.ai_score
+        self.dones[:] = sim.game_over
+        if self.dones.any():
+            sim.reset(self.dones)
+            self.last_player_score[self.dones] = 0
+            self.last_ai_score[self.dones] = 0
+        self._observe()
+
+    def _observe(self):
+        sim = self.sim
+        obs = self.obs
+        np.multiply(sim.ball_x, 2.0 / SCREEN_WIDTH, out=obs[:, 0], casting='unsafe')
+        np.multiply(sim.ball_y, 2.0 / SCREEN_HEIGHT, out=obs[:, 1], casting='unsafe')
+        np.multiply(sim.ball_vx, 1.0 / MAX_ABS_BALL_SPEED_X, out=obs[:, 2], casting='unsafe')
+        np.multiply(sim.ball_vy, 1.0 / MAX_ABS_BALL_SPEED_Y, out=obs[:, 3], casting='unsafe')
+        np.multiply(sim.player_y, 2.0 / SCREEN_HEIGHT, out=obs[:, 4], casting='unsafe')
+        np.multiply(sim.ai_y, 2.0 / SCREEN_HEIGHT, out=obs[:, 5], casting='unsafe')
+        obs[:, (0, 1, 4, 5)] -= 1.0
+
+
+def _worker(conn, shm_name, n, start, stop, opponent, dt, seed):
+    """Subprocess loop: steps matches [start, stop) of the env on command, in shared memory."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        actions, obs, rewards, dones = _shared_arrays(shm.buf, n)
+        env = _EnvSlice(obs[start:stop], rewards[start:stop], dones[start:stop], opponent, dt, seed)
+        actions = actions[start:stop]
+        while True:
+            command = conn.recv_bytes()
+            if command == _CMD_STEP:
+                env.step(actions)
+            elif command == _CMD_RESET:
+                env.reset()
+            else:
+                break
+            conn.send_bytes(command)
+        del actions, obs, rewards, dones, env  # Release the views before closing the block
+    finally:
+        shm.close()
+        conn.close()
+
+
+class PongVectorEnv:
+    """
+    N Pong matches stepped together, for training an agent that plays the left paddle.
+    Args:
+        n (int): Number of matches.
+        opponent (str): 'follow' (the original AI) or 'predictive' (a perfect PredictiveAI).
+        dt (float): Ticks per step.
+        seed (int | None): Seed for serve directions.
+        workers (int): Subprocesses to split the matches across; 0 steps everything in this process.
+    """
+
+    def __init__(self, n, opponent='follow', dt=1.0, seed=None, workers=0):
+        if opponent not in OPPONENTS:
+            raise ValueError(f"unknown opponent {opponent!r}; choose from {', '.join(OPPONENTS)}")
+        self.n = n
+        self.workers = min(workers, n)
+        self._shm = None
+        self._connections = []
+        self._processes = []
+        if self.workers == 0:
+            self._actions = np.zeros(n, dtype=np.int8)
+            self.observations = np.zeros((n, OBSERVATION_SIZE), dtype=np.float32)
+            self.rewards = np.zeros(n, dtype=np.float32)
+            self.dones = np.zeros(n, dtype=bool)
+            self._local = _EnvSlice(self.observations, self.rewards, self.dones, opponent, dt, seed)
+            return
+
+        self._local = None
+        _, size = _shared_layout(n)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._actions, self.observations, self.rewards, self.dones = _shared_arrays(self._shm.buf, n)
+        seeds = np.random.SeedSequence(seed).spawn(self.workers)
+        bounds = np.linspace(0, n, self.workers + 1).astype(int)
+        for i in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, self._shm.name, n, bounds[i], bounds[i + 1], opponent, dt, seeds[i]),
+                daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+    def _broadcast(self, command):
+        for conn in self._connections:
+            conn.send_bytes(command)
+        for conn in self._connections:
+            conn.recv_bytes()
+
+    def reset(self):
+        """
+        Starts a new match everywhere.
+        Returns:
+            np.ndarray: (n, OBSERVATION_SIZE) float32 observations, reused between calls.
+        """
+        if self._local is not None:
+            self._local.reset()
+        else:
+            self._broadcast(_CMD_RESET)
+        return self.observations
+
+    def step(self, actions):
+        """
+        Applies one ACTION_* per match and advances every match by one step.
+        Matches that end are reset, and their next observation is returned.
+        Args:
+            actions (array): n ints in [0, NUM_ACTIONS).
+        Returns:
+            tuple: (observations, rewards, dones), arrays reused between calls. The reward is +1 for
+            each point the agent won in the step and -1 for each point it lost.
+        """
+        self._actions[:] = actions
+        if self._local is not None:
+            self._local.step(self._actions)
+        else:
+            self._broadcast(_CMD_STEP)
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        """Stops the workers and frees the shared memory."""
+        if self._shm is None:
+            return
+        for conn in self._connections:
+            try:
+                conn.send_bytes(_CMD_CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+        for process in self._processes:
+            process.join(timeout=5)
+        self._connections = []
+        self._processes = []
+        self._actions = self.observations = self.rewards = self.dones = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,67 +1,204 @@
-import pygame
+"""
+Ultra!Pong HDR, the interactive game.
+
+Importing this module has no side effects: it opens no window and no audio device, and it
+doesn't import pygame, numpy or PyAudio, so tools can use it in milliseconds. App.start()
+brings the game up, and App.run() plays it.
+"""
 import sys
-import time  # For sound duration, though pyaudio handles it mostly
-import math  # For math.copysign and other functions
-import random # For random choices
+import os
+import time  # perf_counter drives the fixed-timestep loop
+import collections  # deque used as the mixer's trigger queue
+import importlib.util
+import threading  # Subsystems start on background threads
+
+# The game rules live in pongsim so they can run without pygame; this module is the interactive shell.
+from pongsim import (PongSim, PredictiveAI, TICK_RATE, SCREEN_WIDTH, SCREEN_HEIGHT,
+                     EVENT_PADDLE_HIT, EVENT_WALL_HIT, EVENT_SCORE, EVENT_GAME_OVER)
+from pongreplay import ReplayRecorder
+from pongprofile import FrameProfiler, PhaseRing, QualityGovernor, TraceRecorder
+
+# --- Profiling ---
+# Every frame phase is timed into ring buffers; F3 shows rolling percentiles in an overlay.
+PROFILE_OVERLAY = False  # Show the profiler overlay (toggle with F3)
+PROFILE_OVERLAY_REFRESH_MS = 500  # How often the overlay's numbers are re-rendered
+PROFILE_CSV = None  # File to dump the profiler's samples to on exit; None disables the dump
+TRACE_FILE = None  # Chrome trace JSON file to record every phase and sound trigger to; None disables tracing
+profiler = FrameProfiler()
+
+# pygame is imported by App.start(); it takes a few hundred ms, which tools that only need the
+# rules, the replays or the benchmarks shouldn't pay at import.
+pygame = None
 
 # --- Sound Effects (with PyAudio fallback) ---
-try:
-    import pyaudio
-    import numpy as np  # For generating sound waves
-    PYAUDIO_AVAILABLE = True
-except ImportError:
-    PYAUDIO_AVAILABLE = False
+# PyAudio and numpy are imported on first use, by init_audio() and generate_sound_wave()
+pyaudio = None
+np = None
+PYAUDIO_AVAILABLE = importlib.util.find_spec('pyaudio') is not None and importlib.util.find_spec('numpy') is not None
 
 # Global PyAudio objects
 pa = None
 stream = None
+mixer = None
+audio_lock = threading.Lock()  # Orders init_audio() on its thread against terminate_audio()
+audio_closed = False  # Set by terminate_audio(); an init_audio() still opening the device then closes it again
 SAMPLE_RATE = 44100  # Samples per second
+MIXER_FRAMES_PER_BUFFER = 512  # ~12 ms per callback at 44.1 kHz
+MIXER_RING_SAMPLES = SAMPLE_RATE  # 1 s of room for overlapping effects
+MIXER_MAX_VOICES = 8  # Effects that can sound at once; further triggers are dropped
 DURATION_PADDLE_HIT = 0.03
 DURATION_WALL_HIT = 0.02
 DURATION_SCORE = 0.1
 
 
+class SoundMixer:
+    """
+    Mixes triggered effects into a ring buffer that the PyAudio callback drains.
+    The game thread only appends to a deque (O(1), no locks); all mixing happens
+    on the audio thread, so overlapping effects play together, up to max_voices at once.
+    """
+
+    def __init__(self, ring_samples=MIXER_RING_SAMPLES, max_voices=MIXER_MAX_VOICES):
+        self.ring = np.zeros(ring_samples, dtype=np.float32)
+        self.read_pos = 0
+        self.pending = collections.deque()
+        self.max_voices = max_voices  # May be changed from the game thread (see apply_quality())
+        self.position = 0  # Samples rendered so far
+        self.voice_ends = []  # Values of position at which the effects still playing end
+
+    def trigger(self, wave_data):
+        """Queue a float32 buffer for playback. Safe to call from the game thread."""
+        self.pending.append(wave_data)
+
+    def _mix_pending(self):
+        ring = self.ring
+        size = len(ring)
+        pos = self.read_pos
+        position = self.position
+        voice_ends = self.voice_ends = [end for end in self.voice_ends if end > position]
+        while True:
+            try:
+                wave_data = self.pending.popleft()
+            except IndexError:
+                break
+            if len(voice_ends) >= self.max_voices:
+                continue # Polyphony limit reached: drop the effect
+            wave = np.frombuffer(wave_data, dtype=np.float32)[:size]
+            voice_ends.append(position + len(wave))
+            end = pos + len(wave)
+            if end <= size:
+                ring[pos:end] += wave
+            else:  # Wrap around the end of the ring
+                split = size - pos
+                ring[pos:] += wave[:split]
+                ring[:end - size] += wave[split:]
+
+    def render(self, frame_count):
+        """Return the next frame_count mixed samples as float32 bytes (audio thread)."""
+        self._mix_pending()
+        ring = self.ring
+        size = len(ring)
+        pos = self.read_pos
+        end = pos + frame_count
+        if end <= size:
+            out = ring[pos:end].copy()
+            ring[pos:end] = 0.0
+        else:
+            out = np.concatenate((ring[pos:], ring[:end - size]))
+            ring[pos:] = 0.0
+            ring[:end - size] = 0.0
+        self.read_pos = end % size
+        self.position += frame_count
+        np.clip(out, -1.0, 1.0, out=out)  # Overlapping effects can sum past full scale
+        return out.tobytes()
+
+
+def _audio_callback(in_data, frame_count, time_info, status):
+    """PyAudio callback: pull the next block from the mixer."""
+    start = profiler.mark()
+    data = mixer.render(frame_count)
+    profiler.end('audio', start) # Timed on the audio thread, apart from the frame phases
+    if status & pyaudio.paOutputUnderflow:
+        profiler.count('audio_underflow')
+    return data, pyaudio.paContinue
+
+
+def import_numpy():
+    """Imports numpy on first use."""
+    global np
+    if np is None:
+        import numpy as np
+
+
 def init_audio():
-    """Initialize PyAudio and open a stream."""
-    global pa, stream, PYAUDIO_AVAILABLE
+    """Initialize PyAudio and open a callback-mode stream fed by the mixer."""
+    global pa, stream, mixer, pyaudio, PYAUDIO_AVAILABLE
     if PYAUDIO_AVAILABLE:
+        new_pa = new_stream = None
         try:
-            pa = pyaudio.PyAudio()
-            stream = pa.open(format=pyaudio.paFloat32,
-                             channels=1,
-                             rate=SAMPLE_RATE,
-                             output=True)
+            import pyaudio
+            import_numpy()
+            mixer = SoundMixer(max_voices=quality['audio_voices'])
+            new_pa = pyaudio.PyAudio()
+            new_stream = new_pa.open(format=pyaudio.paFloat32,
+                                     channels=1,
+                                     rate=SAMPLE_RATE,
+                                     output=True,
+                                     frames_per_buffer=MIXER_FRAMES_PER_BUFFER,
+                                     stream_callback=_audio_callback)
         except Exception as e:
             print(f"Could not initialize PyAudio: {e}")
             PYAUDIO_AVAILABLE = False
+        with audio_lock:
+            if not audio_closed and PYAUDIO_AVAILABLE:
+                pa, stream = new_pa, new_stream
+                return
+        # The game shut down while the device was opening (or opening failed): release what was opened
+        mixer = None
+        try:
+            if new_stream is not None:
+                new_stream.close()
+            if new_pa is not None:
+                new_pa.terminate()
+        except Exception as e:
+            print(f"Error closing PyAudio: {e}")
 
 
 def terminate_audio():
     """Stop and close PyAudio stream."""
-    global pa, stream, PYAUDIO_AVAILABLE
-    if PYAUDIO_AVAILABLE and stream:
+    global pa, stream, mixer, audio_closed
+    with audio_lock:
+        audio_closed = True # An init_audio() still opening the device releases it itself
+        closing_pa, closing_stream = pa, stream
+        pa = None
+        stream = None
+    if PYAUDIO_AVAILABLE and closing_stream:
         try:
-            if stream.is_active(): # Check if stream is active before stopping
-                stream.stop_stream()
-            stream.close()
+            if closing_stream.is_active(): # Check if stream is active before stopping
+                closing_stream.stop_stream()
+            closing_stream.close()
         except Exception as e:
             print(f"Error stopping/closing PyAudio stream: {e}")
             pass # Continue termination
-    if PYAUDIO_AVAILABLE and pa:
+    if PYAUDIO_AVAILABLE and closing_pa:
         try:
-            pa.terminate()
+            closing_pa.terminate()
         except Exception as e:
             print(f"Error terminating PyAudio: {e}")
             pass
-    # Ensure globals are reset
-    pa = None
-    stream = None
+    mixer = None
 
 
 def generate_sound_wave(frequency, duration, amplitude=0.3, wave_type='sine'):
     """Generate raw audio wave data."""
     if not PYAUDIO_AVAILABLE:
         return b''
+    return synthesize_wave(frequency, duration, amplitude, wave_type)
+
+
+def synthesize_wave(frequency, duration, amplitude=0.3, wave_type='sine'):
+    """The float32 samples of a wave; needs only numpy, not an audio device."""
+    import_numpy()
     t = np.linspace(0, duration, int(SAMPLE_RATE * duration), endpoint=False)
     if wave_type == 'square':
         wave = amplitude * np.sign(np.sin(2 * np.pi * frequency * t))
@@ -72,12 +209,48 @@ def generate_sound_wave(frequency, duration, amplitude=0.3, wave_type='sine'):
     return wave.astype(np.float32).tobytes()
 
 
-def play_sound_effect(frequency, duration, wave_type='sine'):
-    """Play a generated sound wave."""
+# --- Sound Bank ---
+# Effects have fixed parameters, so their buffers are synthesized once and reused.
+# sound_bank maps (frequency, duration, wave_type, amplitude) -> float32 bytes,
+# sound_effects maps an effect name -> its sound_bank key.
+sound_bank = {}
+sound_effects = {}
+
+
+def register_sound_effect(name, frequency, duration, wave_type='sine', amplitude=0.3):
+    """Register a named sound effect; synthesized now if audio is up, else in build_sound_bank()."""
+    key = (frequency, duration, wave_type, amplitude)
+    sound_effects[name] = key
+    if PYAUDIO_AVAILABLE and stream and key not in sound_bank:
+        sound_bank[key] = generate_sound_wave(frequency, duration, amplitude, wave_type)
+    return key
+
+
+def build_sound_bank():
+    """Synthesize buffers for every registered effect. Needs numpy, but not an open stream."""
+    sound_bank.clear()
+    if not PYAUDIO_AVAILABLE:
+        return
+    for frequency, duration, wave_type, amplitude in sound_effects.values():
+        key = (frequency, duration, wave_type, amplitude)
+        if key not in sound_bank:
+            sound_bank[key] = generate_sound_wave(frequency, duration, amplitude, wave_type)
+
+
+def play_sound_effect(frequency, duration, wave_type='sine', amplitude=0.3):
+    """
+    Queue a sound wave on the mixer, synthesizing and caching it on first use.
+    Sounds played before audio is up, or before the sound bank has been built, are dropped.
+    """
     if PYAUDIO_AVAILABLE and stream:
         try:
-            wave_data = generate_sound_wave(frequency, duration, wave_type=wave_type)
-            stream.write(wave_data)
+            key = (frequency, duration, wave_type, amplitude)
+            wave_data = sound_bank.get(key)
+            if wave_data is None:
+                if not subsystem_ready('sound_bank'):
+                    return # The bank thread is synthesizing it; don't stall the game doing it twice
+                wave_data = sound_bank[key] = generate_sound_wave(frequency, duration, amplitude, wave_type)
+            mixer.trigger(wave_data)  # Non-blocking; the audio thread mixes it in
         except Exception as e:
             # This can happen if the stream is closed or audio device issues
             # print(f"Could not play sound: {e}")
@@ -86,31 +259,27 @@ def play_sound_effect(frequency, duration, wave_type='sine'):
             pass
 
 
+def play_registered_sound(name):
+    """Play a registered effect from the sound bank (no synthesis on the hot path)."""
+    key = sound_effects.get(name)
+    if key is not None:
+        profiler.event(name) # Sound triggers show up as instants on the trace timeline
+        play_sound_effect(*key)
+
+
+register_sound_effect('paddle_hit', 660, DURATION_PADDLE_HIT, 'square')
+register_sound_effect('wall_hit', 330, DURATION_WALL_HIT, 'sawtooth') # Changed sound for wall
+register_sound_effect('score', 880, DURATION_SCORE, 'sine')
+
+
 def play_hit_paddle_sound():
-    play_sound_effect(660, DURATION_PADDLE_HIT, 'square')
+    play_registered_sound('paddle_hit')
 
 def play_hit_wall_sound():
-    play_sound_effect(330, DURATION_WALL_HIT, 'sawtooth') # Changed sound for wall
+    play_registered_sound('wall_hit')
 
 def play_score_sound():
-    play_sound_effect(880, DURATION_SCORE, 'sine')
-
-# --- Game Constants ---
-SCREEN_WIDTH = 600
-SCREEN_HEIGHT = 400
-PADDLE_WIDTH = 15
-PADDLE_HEIGHT = 80
-BALL_RADIUS = 8
-AI_PADDLE_SPEED = 6  # Renamed from PADDLE_SPEED and slightly adjusted
-BALL_SPEED_X_INITIAL = 4 # Slightly reduced initial speed for better control
-BALL_SPEED_Y_INITIAL = 4
-
-# Gameplay enhancement constants
-WINNING_SCORE = 5
-PADDLE_HIT_SPEED_INCREASE_FACTOR = 1.07 # How much speed increases on paddle hit
-MAX_ABS_BALL_SPEED_X = 10             # Maximum horizontal ball speed
-PADDLE_BOUNCE_ANGLE_FACTOR = 1.7      # Multiplier for Y speed based on paddle hit location
-MAX_ABS_BALL_SPEED_Y = 8              # Maximum vertical ball speed
+    play_registered_sound('score')
 
 # Colors
 BLACK = (0, 0, 0)
@@ -119,79 +288,415 @@ GRAY = (50, 50, 50) # Darker gray for center line for better contrast
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 
+# --- Timing ---
+# The simulation advances in fixed steps of 1/SIM_HZ s, independent of the render rate;
+# rendering interpolates between the last two sim states.
+SIM_HZ = 120           # Simulation steps per second
+RENDER_FPS = 60        # Render cap; raise for high refresh displays, 0 = uncapped
+MAX_SUBSTEPS = 8       # Max sim steps per rendered frame; beyond this the backlog is dropped
+FRAME_PACING = 'sleep' # How frames are paced to RENDER_FPS: 'sleep' (clock.tick), 'busy' (clock.tick_busy_loop),
+                       # 'hybrid' (sleep, then spin to the deadline) or 'vsync' (the display's refresh)
+PACING_SPIN_MS = 2.0   # 'hybrid': how long before the deadline to stop sleeping and start spinning
+VSYNC_PROBE_FRAMES = 60  # 'vsync': frames measured to tell whether flips block, before settling on a frame period
+VSYNC_BLOCK_SHARE = 0.1  # 'vsync': flips taking under this share of the frame interval aren't waiting for the display
+VSYNC_MAX_HZ = 240       # 'vsync': the fastest plausible refresh rate; frames coming faster can't be vsynced
+
+# --- Display Scaling ---
+# Everything is drawn on a SCREEN_WIDTH x SCREEN_HEIGHT logical surface, which present() scales
+# into the window, letterboxed to keep its aspect ratio. At the logical size the window is drawn
+# on directly and nothing is scaled.
+WINDOW_SIZE = None     # Initial window size, e.g. (1920, 1080); None = the logical size
+FULLSCREEN = False     # Use the whole desktop resolution
+SCALE_FILTER = 'auto'  # 'smooth' (smoothscale), 'fast' (scale), or 'auto': smooth while it fits the budget
+SCALE_BUDGET_FRACTION = 0.25  # Share of the frame time that smoothscale may take in 'auto' mode
+SCALE_RETRY_MS = 5000  # How long 'auto' stays on the fast scaler before trying smoothscale again
+
+# --- Quality Governor ---
+# Optional quality is stepped down a level at a time while frames run over budget, and back up
+# when there is headroom again (see pongprofile.QualityGovernor). Levels go from lowest to highest.
+QUALITY_GOVERNOR = True  # Adapt quality to the frame time; False stays at the highest level
+QUALITY_LEVELS = (
+    {'aa_center_line': False, 'smooth_scaling': False, 'audio_voices': 2},
+    {'aa_center_line': True, 'smooth_scaling': False, 'audio_voices': 4},
+    {'aa_center_line': True, 'smooth_scaling': False, 'audio_voices': MIXER_MAX_VOICES},
+    {'aa_center_line': True, 'smooth_scaling': True, 'audio_voices': MIXER_MAX_VOICES},
+)
+quality_level = len(QUALITY_LEVELS) - 1  # The current level, shown in the profiler overlay
+quality = QUALITY_LEVELS[quality_level]  # The current level's settings
+
+# --- Replays ---
+REPLAY_DIR = None      # Directory to save a replay of every finished match in; None disables recording
+
+# --- Subsystem Startup ---
+# Subsystems the window doesn't need to appear (audio, the sound bank, fonts) are initialized
+# on background threads. Each one reports readiness through a threading.Event, and its init
+# time is recorded by the profiler as an 'init_<name>' phase.
+SUBSYSTEM_SHUTDOWN_WAIT = 2.0  # Seconds shutdown waits for a subsystem still starting
+subsystems = {}  # Subsystem name -> threading.Event set once it is up (or has failed)
+
+
+def start_subsystem(name, init):
+    """Runs init() on a daemon thread; subsystem_ready(name) becomes True when it returns."""
+    ready = subsystems[name] = threading.Event()
+
+    def run():
+        start = profiler.mark()
+        try:
+            init()
+        except Exception as e:
+            print(f"Could not initialize {name}: {e}")
+        finally:
+            profiler.end('init_' + name, start)
+            ready.set()
+
+    threading.Thread(target=run, name='init-' + name, daemon=True).start()
+
+
+def subsystem_ready(name):
+    """True once the named subsystem has finished starting."""
+    ready = subsystems.get(name)
+    return ready is not None and ready.is_set()
+
+
+def wait_for_subsystem(name, timeout=None):
+    """Blocks until the named subsystem has started, if it is starting. Returns whether it is ready."""
+    ready = subsystems.get(name)
+    return ready is None or ready.wait(timeout)
+
+
 # --- Pygame Setup ---
-pygame.init()
-init_audio() # Initialize audio system
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Ultra!Pong HDR 1.0A - Enhanced")
-clock = pygame.time.Clock()
-try:
-    font = pygame.font.Font(None, 74) # Default font
-    small_font = pygame.font.Font(None, 36)
-except pygame.error: # Fallback if default font is not found (e.g. minimal systems)
-    font = pygame.font.SysFont("arial", 74)
-    small_font = pygame.font.SysFont("arial", 36)
+# Set up by App.start()
+screen = None  # Logical surface everything is drawn on; the window itself when not scaling
+window = None  # The display surface
+clock = None
+font = None
+small_font = None
+profile_font = None
 
 
-# --- Game Objects ---
-# Player paddle (left side)
-player_paddle = pygame.Rect(30, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
-# AI paddle (right side)
-ai_paddle = pygame.Rect(SCREEN_WIDTH - 30 - PADDLE_WIDTH, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
-# Ball
-ball = pygame.Rect(SCREEN_WIDTH // 2 - BALL_RADIUS, SCREEN_HEIGHT // 2 - BALL_RADIUS, BALL_RADIUS * 2, BALL_RADIUS * 2)
+def import_pygame():
+    """Imports pygame and initializes the modules the game uses."""
+    global pygame
+    import pygame
+    pygame.display.init() # Not pygame.init(): it would also open SDL's audio device, which the game doesn't use
+    pygame.font.init()
 
-# --- Game State ---
-ball_speed_x = BALL_SPEED_X_INITIAL
-ball_speed_y = BALL_SPEED_Y_INITIAL
-player_score = 0
-ai_score = 0
-game_paused = False
-game_over = False
-winner = ""
-
-def reset_ball(served_by_player_next):
+
+def init_display():
+    """Opens the window."""
+    global clock, REDRAW_EVENTS
+    global FRAME_PACING
+    flags = pygame.FULLSCREEN if FULLSCREEN else pygame.RESIZABLE
+    if FRAME_PACING == 'vsync':
+        # SDL only offers vsync through its renderer, which also does the scaling (in hardware) here
+        try:
+            pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), flags | pygame.SCALED, vsync=1)
+        except pygame.error as e:
+            print(f"Could not enable vsync: {e}")
+            FRAME_PACING = 'hybrid'
+    if FRAME_PACING != 'vsync':
+        if FULLSCREEN:
+            pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            pygame.display.set_mode(WINDOW_SIZE or (SCREEN_WIDTH, SCREEN_HEIGHT), pygame.RESIZABLE)
+    pygame.display.set_caption("Ultra!Pong HDR 1.0A - Enhanced")
+    clock = pygame.time.Clock()
+    REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.VIDEORESIZE)
+    update_viewport()
+
+
+# --- Scaled Output ---
+logical_surface = None  # Off-screen logical surface, allocated the first time the window is not the logical size
+viewport = None         # Where the logical surface appears in the window
+viewport_surface = None # Subsurface of the window at viewport: the scalers write straight into it
+scale_smooth = True     # Whether 'auto' currently uses smoothscale
+smooth_cost_ms = 0.0    # Moving average of smoothscale's cost
+smooth_retry_at = 0     # pygame.time.get_ticks() at which 'auto' tries smoothscale again
+
+
+def update_viewport():
+    """Fits the logical surface to the current window size. Call after the window is created or resized."""
+    global screen, window, viewport, viewport_surface, logical_surface, scale_smooth, smooth_cost_ms
+    window = pygame.display.get_surface()
+    scale_smooth = True # Measure smoothscale again at the new size
+    smooth_cost_ms = 0.0
+    width, height = window.get_size()
+    if (width, height) == (SCREEN_WIDTH, SCREEN_HEIGHT):
+        screen = window
+        viewport = window.get_rect()
+        viewport_surface = None
+    else:
+        if logical_surface is None:
+            logical_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        screen = logical_surface
+        scale = min(width / SCREEN_WIDTH, height / SCREEN_HEIGHT)
+        viewport = pygame.Rect(0, 0, max(1, round(SCREEN_WIDTH * scale)), max(1, round(SCREEN_HEIGHT * scale)))
+        viewport.center = (width // 2, height // 2)
+        window.fill(BLACK) # Letterbox bars; only the viewport is drawn after this
+        viewport_surface = window.subsurface(viewport)
+    invalidate_dirty_rects()
+
+
+def scale_to_window():
+    """Scales the logical surface into the viewport, choosing the filter by SCALE_FILTER and the frame budget."""
+    global scale_smooth, smooth_cost_ms, smooth_retry_at
+    smooth = SCALE_FILTER == 'smooth'
+    if SCALE_FILTER == 'auto':
+        if not scale_smooth and pygame.time.get_ticks() >= smooth_retry_at:
+            scale_smooth = True # Conditions may have changed; measure smoothscale again
+            smooth_cost_ms = 0.0
+        smooth = scale_smooth
+    if not smooth or not quality['smooth_scaling']: # The quality governor may have turned smoothing off
+        pygame.transform.scale(screen, viewport.size, viewport_surface)
+        return
+    start = time.perf_counter()
+    pygame.transform.smoothscale(screen, viewport.size, viewport_surface)
+    cost_ms = (time.perf_counter() - start) * 1000.0
+    smooth_cost_ms = cost_ms if not smooth_cost_ms else smooth_cost_ms * 0.9 + cost_ms * 0.1
+    budget_ms = 1000.0 / (RENDER_FPS or 60) * SCALE_BUDGET_FRACTION
+    if smooth_cost_ms > budget_ms:
+        scale_smooth = False
+        smooth_retry_at = pygame.time.get_ticks() + SCALE_RETRY_MS
+
+
+def present(changed=None):
     """
-    Resets the ball to the center and sets its initial speed and direction.
+    Shows the logical surface in the window.
     Args:
-        served_by_player_next (bool): True if the player serves next, False if AI serves.
+        changed (list | None): Rects that changed, to push only those when not scaling; None pushes everything.
     """
-    global ball_speed_x, ball_speed_y
-    ball.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+    if viewport_surface is None:
+        if changed is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(changed)
+        return
+    scale_to_window()
+    pygame.display.flip()
 
-    if served_by_player_next:
-        ball_speed_x = BALL_SPEED_X_INITIAL
-    else:  # Served by AI next
-        ball_speed_x = -BALL_SPEED_X_INITIAL
-    
-    # Alternate y direction for variety on serve
-    if random.choice([True, False]): # Using random.choice for more explicit randomness
-        ball_speed_y = BALL_SPEED_Y_INITIAL
+
+def window_to_logical(x, y):
+    """Maps a window position (e.g. the mouse) to logical screen coordinates."""
+    if viewport_surface is None:
+        return x, y
+    return ((x - viewport.x) * SCREEN_WIDTH / viewport.width,
+            (y - viewport.y) * SCREEN_HEIGHT / viewport.height)
+
+
+def load_fonts():
+    """Loads the fonts used by the menu, HUD and profiler overlay."""
+    global font, small_font, profile_font
+    try:
+        font = pygame.font.Font(None, 74) # Default font
+        small_font = pygame.font.Font(None, 36)
+        profile_font = pygame.font.Font(None, 20)
+    except pygame.error: # Fallback if default font is not found (e.g. minimal systems)
+        font = pygame.font.SysFont("arial", 74)
+        small_font = pygame.font.SysFont("arial", 36)
+        profile_font = pygame.font.SysFont("arial", 20)
+
+
+# --- Text Cache ---
+# Font rasterization is the most expensive call in a frame, so rendered text surfaces are
+# cached by (font, text, color, antialias) and the least recently used ones evicted.
+TEXT_CACHE_SIZE = 64
+text_cache = collections.OrderedDict()
+
+
+def render_text(text_font, text, color, antialias=True):
+    """Returns a surface for text, rendering it only if it is not already cached."""
+    key = (text_font, text, color, antialias)
+    surface = text_cache.get(key)
+    if surface is None:
+        surface = text_cache[key] = text_font.render(text, antialias, color)
+        if len(text_cache) > TEXT_CACHE_SIZE:
+            text_cache.popitem(last=False)
     else:
-        ball_speed_y = -BALL_SPEED_Y_INITIAL
+        text_cache.move_to_end(key)
+    return surface
+
+
+# --- Game State ---
+AI_DIFFICULTY = None   # 'easy', 'normal', 'hard' or 'perfect' for a PredictiveAI opponent; None keeps the original AI
+sim = PongSim()
+ai = None  # The PredictiveAI steering the AI paddle, created by reset_game() when AI_DIFFICULTY is set
+
+# --- Game Objects ---
+# Draw-side mirrors of the simulated bodies, refreshed by sync_rects(); created by App.start()
+player_paddle = None
+ai_paddle = None
+ball = None
+
+
+def create_game_objects():
+    """Creates the pygame.Rects that the paddles and ball are drawn with."""
+    global player_paddle, ai_paddle, ball
+    player_paddle = pygame.Rect(0, 0, sim.player_paddle.w, sim.player_paddle.h)
+    ai_paddle = pygame.Rect(0, 0, sim.ai_paddle.w, sim.ai_paddle.h)
+    ball = pygame.Rect(0, 0, sim.ball.w, sim.ball.h)
+    sync_rects()
+
+
+# Positions before the latest sim step, or None to draw the current state as is
+previous_positions = None
+
+
+def sim_positions():
+    """Returns the moving coordinates of the simulation: (ball x, ball y, player paddle y, AI paddle y)."""
+    return (sim.ball.x, sim.ball.y, sim.player_paddle.y, sim.ai_paddle.y)
+
+
+def sync_rects(alpha=1.0):
+    """
+    Copies the simulated positions into the pygame.Rects used for drawing.
+    Args:
+        alpha (float): How far to interpolate from the previous sim state (0) to the current one (1).
+    """
+    ball_x, ball_y, player_y, ai_y = sim_positions()
+    if previous_positions is not None and alpha < 1.0:
+        prev_ball_x, prev_ball_y, prev_player_y, prev_ai_y = previous_positions
+        ball_x = prev_ball_x + (ball_x - prev_ball_x) * alpha
+        ball_y = prev_ball_y + (ball_y - prev_ball_y) * alpha
+        player_y = prev_player_y + (player_y - prev_player_y) * alpha
+        ai_y = prev_ai_y + (ai_y - prev_ai_y) * alpha
+    player_paddle.topleft = (sim.player_paddle.x, player_y)
+    ai_paddle.topleft = (sim.ai_paddle.x, ai_y)
+    ball.topleft = (ball_x, ball_y)
+
 
 def reset_game():
     """Resets the game to its initial state."""
-    global player_score, ai_score, game_over, winner, game_paused
-    global ball_speed_x, ball_speed_y # These will be set by reset_ball
-
-    player_score = 0
-    ai_score = 0
-    game_over = False
-    winner = ""
-    game_paused = False
-    
-    # Reset paddle positions
-    player_paddle.centery = SCREEN_HEIGHT // 2
-    ai_paddle.centery = SCREEN_HEIGHT // 2
-    
-    # Decide who serves first in a new game (randomly)
-    serves_first_by_player = random.choice([True, False])
-    reset_ball(serves_first_by_player)
+    global previous_positions, recorder, ai
+    sim.reset_game()
+    ai = PredictiveAI(sim, AI_DIFFICULTY) if AI_DIFFICULTY is not None else None
+    previous_positions = None
+    sync_rects()
+    if REPLAY_DIR is not None:
+        recorder = ReplayRecorder(sim.seed, TICK_RATE / SIM_HZ, sim, ai=ai)
+
+
+# Records the current match when REPLAY_DIR is set
+recorder = None
+
+
+def save_replay():
+    """Writes the recorded match to REPLAY_DIR, named by finish time and seed."""
+    global recorder
+    if recorder is None:
+        return
+    path = os.path.join(REPLAY_DIR, f"match-{time.strftime('%Y%m%d-%H%M%S')}-{recorder.seed:08x}.uprp")
+    try:
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        recorder.save(path)
+    except OSError as e:
+        print(f"Could not save replay: {e}")
+    recorder = None
+
+# --- Static Layers ---
+# Content that does not change from frame to frame (background, center line, menu chrome)
+# is painted once into a convert()-ed surface and blitted. Layers are rebuilt only after
+# invalidate_layers(), on a resolution or theme change.
+layer_builders = {}  # Layer name -> function that paints the layer onto a surface
+layers = {}          # Layer name -> cached surface
+
+
+def register_layer(name, builder):
+    """Registers a static layer; builder(surface) paints it onto a screen-sized surface."""
+    layer_builders[name] = builder
+    layers.pop(name, None)
+
+
+def get_layer(name):
+    """Returns the cached surface for a layer, painting it first if needed."""
+    surface = layers.get(name)
+    if surface is None:
+        surface = pygame.Surface(screen.get_size()).convert()
+        layer_builders[name](surface)
+        layers[name] = surface
+    return surface
+
+
+def invalidate_layers():
+    """Drops every cached layer, so each one is repainted on next use."""
+    layers.clear()
+    invalidate_dirty_rects()
+
+
+def build_court_layer(surface):
+    """Black background and center line behind the paddles and ball."""
+    surface.fill(BLACK)
+    draw_line = pygame.draw.aaline if quality['aa_center_line'] else pygame.draw.line
+    draw_line(surface, GRAY, (SCREEN_WIDTH // 2, 0), (SCREEN_WIDTH // 2, SCREEN_HEIGHT))
+
+
+def build_menu_layer(surface):
+    """The whole main menu screen."""
+    surface.fill(BLACK)
+    title_text = render_text(font, "Ultra!Pong HDR 1.0A", WHITE)
+    # Using a slightly different approach for subtitle for clarity
+    subtitle_line1 = render_text(small_font, "[C] Team Flames 20XX", GRAY)
+    subtitle_line2 = render_text(small_font, "[C] Enhanced 2024-2025", GRAY) # Updated year
+    prompt_text = render_text(small_font, "ENTER: Start Game   ESC: Quit", WHITE)
+
+    surface.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3)))
+    surface.blit(subtitle_line1, subtitle_line1.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3 + 60)))
+    surface.blit(subtitle_line2, subtitle_line2.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3 + 90)))
+    surface.blit(prompt_text, prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50)))
+
+
+register_layer('court', build_court_layer)
+register_layer('menu', build_menu_layer)
+
+
+def apply_quality(level):
+    """Switches the optional features to QUALITY_LEVELS[level]."""
+    global quality, quality_level
+    previous = quality
+    quality_level = level
+    quality = QUALITY_LEVELS[level]
+    if quality['aa_center_line'] != previous['aa_center_line']:
+        layers.pop('court', None) # Repainted with the other line style on next use
+        invalidate_dirty_rects()
+    if mixer is not None:
+        mixer.max_voices = quality['audio_voices']
+
+
+# Score surfaces and positions, rebuilt by score_hud() only when a score changes
+hud_scores = None
+hud_blits = ()
+
+
+def score_hud():
+    """Returns (surface, rect) pairs for both scores, re-rendering only after a score changed."""
+    global hud_scores, hud_blits
+    scores = (sim.player_score, sim.ai_score)
+    if scores != hud_scores:
+        player_text = render_text(font, str(sim.player_score), WHITE)
+        ai_text = render_text(font, str(sim.ai_score), WHITE)
+        hud_blits = ((player_text, player_text.get_rect(topleft=(SCREEN_WIDTH // 4 - player_text.get_width() // 2, 20))),
+                     (ai_text, ai_text.get_rect(topleft=(3 * SCREEN_WIDTH // 4 - ai_text.get_width() // 2, 20))))
+        hud_scores = scores
+    return hud_blits
+
+
+def overlay_blits():
+    """Returns (surface, rect) pairs for the Pause/Game Over messages, if one is showing."""
+    if sim.paused and not sim.game_over:
+        pause_msg_render = render_text(small_font, "PAUSED", WHITE)
+        resume_msg_render = render_text(small_font, "Press P to Resume", WHITE)
+        return ((pause_msg_render, pause_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))),
+                (resume_msg_render, resume_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))))
+    if sim.game_over:
+        winner_msg_render = render_text(font, f"{sim.winner} Wins!", WHITE) # Larger font for winner
+        play_again_msg_render = render_text(small_font, "Play Again? (Y/N)", WHITE)
+        return ((winner_msg_render, winner_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 30))),
+                (play_again_msg_render, play_again_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))))
+    return ()
+
 
 def draw_elements():
     """Draws all game elements to the screen."""
-    screen.fill(BLACK) # Black background
+    screen.blit(get_layer('court'), (0, 0)) # Black background and center line
 
     # Draw paddles
     pygame.draw.rect(screen, BLUE, player_paddle) # Player paddle color
@@ -199,218 +704,478 @@ def draw_elements():
     
     # Draw ball
     pygame.draw.ellipse(screen, WHITE, ball)
-    
-    # Draw center line
-    pygame.draw.aaline(screen, GRAY, (SCREEN_WIDTH // 2, 0), (SCREEN_WIDTH // 2, SCREEN_HEIGHT))
 
     # Draw scores
-    player_text = font.render(str(player_score), True, WHITE)
-    ai_text = font.render(str(ai_score), True, WHITE)
-    screen.blit(player_text, (SCREEN_WIDTH // 4 - player_text.get_width() // 2, 20))
-    screen.blit(ai_text, (3 * SCREEN_WIDTH // 4 - ai_text.get_width() // 2, 20))
+    screen.blits(score_hud())
 
     # Pause/Game Over display
-    if game_paused and not game_over:
-        pause_msg_text = "PAUSED"
-        resume_msg_text = "Press P to Resume"
-        pause_msg_render = small_font.render(pause_msg_text, True, WHITE)
-        resume_msg_render = small_font.render(resume_msg_text, True, WHITE)
-        screen.blit(pause_msg_render, pause_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20)))
-        screen.blit(resume_msg_render, resume_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20)))
-
-    elif game_over:
-        winner_msg_text = f"{winner} Wins!"
-        play_again_msg_text = "Play Again? (Y/N)"
-        winner_msg_render = font.render(winner_msg_text, True, WHITE) # Larger font for winner
-        play_again_msg_render = small_font.render(play_again_msg_text, True, WHITE)
-        screen.blit(winner_msg_render, winner_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 30)))
-        screen.blit(play_again_msg_render, play_again_msg_render.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20)))
-
-def update_game_state():
-    """Updates the game state, including ball movement, collisions, and AI."""
-    global ball_speed_x, ball_speed_y, player_score, ai_score, game_over, winner
-
-    if game_paused or game_over:
-        return
+    screen.blits(overlay_blits())
 
-    # --- Ball Movement ---
-    ball.x += ball_speed_x
-    ball.y += ball_speed_y
 
-    # --- Paddle Collision and Response ---
-    collided_with_paddle_this_frame = False # To prevent double wall sound if paddle hit near wall
+# Profiler overlay surfaces and positions, re-rendered every PROFILE_OVERLAY_REFRESH_MS
+profile_overlay_blits = []
+profile_overlay_rect = None
+profile_overlay_time = 0
 
-    # Player paddle collision (left paddle)
-    if ball.colliderect(player_paddle):
-        collided_with_paddle_this_frame = True
-        play_hit_paddle_sound()
-        
-        # Correct ball position to be flush with paddle
-        ball.left = player_paddle.right
-        
-        # Calculate new ball_speed_x (increase speed and make it positive)
-        current_abs_speed_x = abs(ball_speed_x) # Speed before this collision
-        new_abs_speed_x = min(current_abs_speed_x * PADDLE_HIT_SPEED_INCREASE_FACTOR, MAX_ABS_BALL_SPEED_X)
-        ball_speed_x = new_abs_speed_x  # Positive direction (moving right)
-
-        # Calculate new ball_speed_y based on impact point
-        delta_y = ball.centery - player_paddle.centery
-        normalized_delta_y = delta_y / (PADDLE_HEIGHT / 2) # Range approx -1 to 1
-        ball_speed_y = normalized_delta_y * BALL_SPEED_Y_INITIAL * PADDLE_BOUNCE_ANGLE_FACTOR
-
-    # AI paddle collision (right paddle)
-    elif ball.colliderect(ai_paddle):
-        collided_with_paddle_this_frame = True
-        play_hit_paddle_sound()
 
-        # Correct ball position
-        ball.right = ai_paddle.left
-        
-        # Calculate new ball_speed_x (increase speed and make it negative)
-        current_abs_speed_x = abs(ball_speed_x) # Speed before this collision
-        new_abs_speed_x = min(current_abs_speed_x * PADDLE_HIT_SPEED_INCREASE_FACTOR, MAX_ABS_BALL_SPEED_X)
-        ball_speed_x = -new_abs_speed_x # Negative direction (moving left)
-
-        # Calculate new ball_speed_y
-        delta_y = ball.centery - ai_paddle.centery
-        normalized_delta_y = delta_y / (PADDLE_HEIGHT / 2)
-        ball_speed_y = normalized_delta_y * BALL_SPEED_Y_INITIAL * PADDLE_BOUNCE_ANGLE_FACTOR
-
-    # Common adjustments for ball_speed_y if a paddle collision occurred
-    if collided_with_paddle_this_frame:
-        # Cap ball_speed_y
-        if abs(ball_speed_y) > MAX_ABS_BALL_SPEED_Y:
-            ball_speed_y = math.copysign(MAX_ABS_BALL_SPEED_Y, ball_speed_y)
-        # Ensure minimum vertical speed if not zero, to prevent overly flat shots making game stall
-        elif 0 < abs(ball_speed_y) < 1.0:
-            ball_speed_y = math.copysign(1.0, ball_speed_y)
-        # If ball_speed_y is exactly 0.0 (center hit), it remains 0.0 for a straight shot
-
-    # --- Wall Collisions (Y-axis) ---
-    # These are checked after paddle collisions to correctly handle edge cases
-    if ball.top <= 0:
-        ball.top = 0  # Clamp position
-        ball_speed_y *= -1
-        if not collided_with_paddle_this_frame: # Avoid double sound if hit paddle then wall instantly
-             play_hit_wall_sound()
-    elif ball.bottom >= SCREEN_HEIGHT:
-        ball.bottom = SCREEN_HEIGHT  # Clamp position
-        ball_speed_y *= -1
-        if not collided_with_paddle_this_frame:
-            play_hit_wall_sound()
-
-    # --- Scoring ---
-    point_scored = False
-    serve_to_player_next = False
-
-    if ball.left <= 0:  # AI scores (ball went off left edge)
-        ai_score += 1
-        play_score_sound()
-        point_scored = True
-        serve_to_player_next = True # Player serves next
-        if ai_score >= WINNING_SCORE:
-            game_over = True
-            winner = "AI"
-    elif ball.right >= SCREEN_WIDTH:  # Player scores (ball went off right edge)
-        player_score += 1
+def draw_profile_overlay():
+    """Draws a p50/p95/p99 table of the frame phases in the bottom-left corner."""
+    global profile_overlay_blits, profile_overlay_rect, profile_overlay_time
+    now = pygame.time.get_ticks()
+    if not profile_overlay_blits or now - profile_overlay_time >= PROFILE_OVERLAY_REFRESH_MS:
+        rows = [("ms", "p50", "p95", "p99")]
+        rows += [(phase, *(f"{ms:.2f}" for ms in values)) for phase, values in profiler.summary()]
+        rows += [(counter, str(total)) for counter, total in list(profiler.counters.items())] # The audio thread may add counters
+        rows.append(("quality_level", str(quality_level)))
+        line_height = profile_font.get_linesize()
+        top = SCREEN_HEIGHT - 8 - line_height * len(rows)
+        profile_overlay_blits = []
+        for i, row in enumerate(rows):
+            x = 8
+            for j, cell in enumerate(row):
+                surface = profile_font.render(cell, True, WHITE) # Changes every refresh, so not cached
+                profile_overlay_blits.append((surface, (x, top + i * line_height)))
+                x += 130 if j == 0 else 48 # Fixed columns, since the font is proportional
+        profile_overlay_rect = pygame.Rect(4, top - 4, 130 + 3 * 48 + 8, line_height * len(rows) + 8)
+        profile_overlay_time = now
+    pygame.draw.rect(screen, BLACK, profile_overlay_rect)
+    screen.blits(profile_overlay_blits)
+
+
+def toggle_profile_overlay():
+    """Shows or hides the profiler overlay."""
+    global PROFILE_OVERLAY
+    PROFILE_OVERLAY = not PROFILE_OVERLAY
+    invalidate_dirty_rects() # Erase the overlay, or draw under it in full
+
+
+# --- Dirty-Rect Rendering ---
+# Optional mode that restores only the regions that changed from the static court layer
+# and pushes just those with pygame.display.update(rects), instead of flipping the whole
+# surface. Worth enabling where blit bandwidth is the bottleneck (software rendering, VNC).
+DIRTY_RECT_RENDERING = False
+dirty_full_redraw = True  # Redraw and push the whole screen on the next frame
+dirty_object_rects = []   # Where the paddles and ball were drawn last frame
+dirty_text_rects = []     # Where text was drawn last frame
+dirty_text_state = None   # The scores and messages that text showed
+
+
+def invalidate_dirty_rects():
+    """Makes the next draw_elements_dirty() call redraw and push the whole screen."""
+    global dirty_full_redraw
+    dirty_full_redraw = True
+
+
+def draw_elements_dirty():
+    """
+    Draws the frame incrementally.
+    Returns:
+        list: The rects of the screen that changed and must be passed to pygame.display.update().
+    """
+    global dirty_full_redraw, dirty_object_rects, dirty_text_rects, dirty_text_state
+    background = get_layer('court')
+    full_redraw = dirty_full_redraw
+    if full_redraw:
+        screen.blit(background, (0, 0))
+        dirty_text_state = None
+        dirty_full_redraw = False
+    changed = []
+
+    # Erase last frame's paddles and ball
+    for rect in dirty_object_rects:
+        screen.blit(background, rect, rect)
+    changed.extend(dirty_object_rects)
+    object_rects = [player_paddle.copy(), ai_paddle.copy(), ball.copy()]
+
+    # Erase text that is no longer shown
+    text = score_hud() + overlay_blits()
+    text_state = (sim.player_score, sim.ai_score, sim.paused, sim.game_over, sim.winner)
+    if text_state != dirty_text_state:
+        for rect in dirty_text_rects:
+            screen.blit(background, rect, rect)
+        changed.extend(dirty_text_rects)
+        dirty_text_rects = [rect for _, rect in text]
+        redraw_text = list(text)
+        dirty_text_state = text_state
+    else:
+        # Antialiased text can't be blitted over itself, so only text that a moving object
+        # touched is cleared back to the background and drawn again
+        touched = dirty_object_rects + object_rects
+        redraw_text = [(surface, rect) for surface, rect in text if rect.collidelist(touched) != -1]
+        for _, rect in redraw_text:
+            screen.blit(background, rect, rect)
+    changed.extend(rect for _, rect in redraw_text)
+
+    # Draw paddles and ball, with text on top
+    pygame.draw.rect(screen, BLUE, player_paddle)
+    pygame.draw.rect(screen, RED, ai_paddle)
+    pygame.draw.ellipse(screen, WHITE, ball)
+    screen.blits(redraw_text)
+    dirty_object_rects = object_rects
+    changed.extend(object_rects)
+
+    if full_redraw:
+        return [screen.get_rect()]
+    return changed
+
+
+def update_game_state(dt=1.0):
+    """Advances the simulation dt ticks with the mouse as player input, and plays its sounds."""
+    global previous_positions
+    previous_positions = sim_positions()
+    mouse_y = window_to_logical(*pygame.mouse.get_pos())[1]
+    running = not (sim.paused or sim.game_over)
+    if recorder is not None and running:
+        mouse_y = recorder.record(mouse_y) # Step with the whole-pixel input the replay stores, not a scaled fraction
+    ai_y = ai.target() if ai is not None and running else None # After record(), which snapshots the AI's aim
+    events = sim.step(mouse_y, ai_y, dt)
+    if events & EVENT_PADDLE_HIT:
+        play_hit_paddle_sound()
+    elif events & EVENT_WALL_HIT:
+        play_hit_wall_sound()
+    if events & EVENT_SCORE:
         play_score_sound()
-        point_scored = True
-        serve_to_player_next = False # AI serves next
-        if player_score >= WINNING_SCORE:
-            game_over = True
-            winner = "Player"
-    
-    if point_scored and not game_over:
-        reset_ball(serve_to_player_next)
-    elif point_scored and game_over: # If game ends, just center the ball visually
-        ball.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-        ball_speed_x = 0 # Stop ball movement
-        ball_speed_y = 0
+        previous_positions = None  # The ball was re-served; don't interpolate across the jump
+    if events & EVENT_GAME_OVER:
+        save_replay()
+
+
+# --- Idle Screens ---
+# Menu, pause and game-over screens don't change on their own, so they are drawn once and the
+# loop then blocks in pygame.event.wait() instead of redrawing at full rate.
+IDLE_WAIT_MS = 250  # Longest an idle screen sleeps without an event
+REDRAW_EVENTS = ()  # Events meaning the window needs repainting; set by init_display()
+
+
+def render_frame(alpha=1.0):
+    """
+    Draws and presents one game frame, interpolated alpha of the way into the latest sim step.
+    Returns:
+        int: The profiler time at which drawing finished and presenting began.
+    """
+    sync_rects(alpha)
+    mark = profiler.mark()
+    if DIRTY_RECT_RENDERING and not PROFILE_OVERLAY: # The overlay changes too often for dirty rects
+        changed = draw_elements_dirty()
+        mark = profiler.end('draw', mark)
+        present(changed) # Push only what changed
+    else:
+        draw_elements()
+        if PROFILE_OVERLAY:
+            draw_profile_overlay()
+        mark = profiler.end('draw', mark)
+        present() # Update the display
+    profiler.end('present', mark)
+    return mark
 
 
-    # --- Player Paddle Control ---
-    mouse_y = pygame.mouse.get_pos()[1]
-    player_paddle.centery = mouse_y
-    # Clamp player paddle to screen bounds
-    player_paddle.clamp_ip(screen.get_rect())
+def handle_game_event(event):
+    """Applies one input event to the game. Returns False if the game should quit."""
+    if event.type == pygame.QUIT:
+        return False
+    if event.type in REDRAW_EVENTS:
+        update_viewport() # The window may have been resized
+    elif event.type == pygame.KEYDOWN:
+        if event.key == pygame.K_F3:
+            toggle_profile_overlay()
+        elif event.key == pygame.K_p and not sim.game_over: # Pause only if game not over
+            sim.paused = not sim.paused
+        elif sim.game_over: # Only handle Y/N if game is over
+            if event.key == pygame.K_y:
+                reset_game() # Reset for a new game
+            elif event.key == pygame.K_n:
+                return False # Quit to main menu (or exit)
+        elif event.key == pygame.K_ESCAPE: # Allow ESC to pause or go to menu
+            if sim.paused:
+                sim.paused = False # Unpause
+            elif not sim.game_over: # If game is running, pause it
+                sim.paused = True
+            # If game_over, ESC does nothing here (Y/N is primary)
+    return True
 
 
-    # --- AI Paddle Control (Simple AI) ---
-    # AI tries to follow the ball's y-coordinate
-    if ai_paddle.centery < ball.centery - AI_PADDLE_SPEED / 2: # Added a small deadzone
-        ai_paddle.y += AI_PADDLE_SPEED
-    elif ai_paddle.centery > ball.centery + AI_PADDLE_SPEED / 2:
-        ai_paddle.y -= AI_PADDLE_SPEED
-    # Clamp AI paddle to screen bounds
-    ai_paddle.clamp_ip(screen.get_rect())
+def idle_state():
+    """What an idle screen shows; it only needs redrawing when this changes."""
+    return (sim.paused, sim.game_over, sim.winner, sim.player_score, sim.ai_score)
+
+
+def draw_menu():
+    """Draws and presents the main menu screen."""
+    wait_for_subsystem('fonts') # The menu is mostly text
+    screen.blit(get_layer('menu'), (0, 0)) # Title, credits and prompt, painted once
+    present()
 
 
 def main_menu():
     """Displays the main menu and waits for player input."""
-    menu_active = True
-    while menu_active:
-        screen.fill(BLACK)
-        title_text = font.render("Ultra!Pong HDR 1.0A", True, WHITE)
-        # Using a slightly different approach for subtitle for clarity
-        subtitle_line1 = small_font.render("[C] Team Flames 20XX", True, GRAY)
-        subtitle_line2 = small_font.render("[C] Enhanced 2024-2025", True, GRAY) # Updated year
-        prompt_text = small_font.render("ENTER: Start Game   ESC: Quit", True, WHITE)
-
-        screen.blit(title_text, title_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3)))
-        screen.blit(subtitle_line1, subtitle_line1.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3 + 60)))
-        screen.blit(subtitle_line2, subtitle_line2.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3 + 90)))
-        screen.blit(prompt_text, prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 50)))
-        
-        pygame.display.flip()
-        clock.tick(30) # Menu doesn't need full 60 FPS
+    redraw = True
+    while True:
+        if redraw:
+            draw_menu()
+            redraw = False
+
+        event = pygame.event.wait(IDLE_WAIT_MS) # Sleep until there is something to do
+        if event.type == pygame.QUIT:
+            return False  # Signal to quit the entire application
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
+                return True  # Signal to start the game
+            if event.key == pygame.K_ESCAPE:
+                return False # Signal to quit
+        elif event.type in REDRAW_EVENTS:
+            update_viewport() # The window may have been resized
+            redraw = True
+
+# --- Frame Pacing ---
+class FramePacer:
+    """
+    Ends each frame by waiting with a FRAME_PACING strategy, and measures the intervals
+    between frames to show how evenly they are paced.
+    With 'vsync', frames come at the display's refresh rate, whatever it is. Over the first
+    VSYNC_PROBE_FRAMES frames the pacer checks that flips really wait for the display, and then
+    takes the measured interval as its period. If flips return right away, vsync isn't in effect:
+    the window is reopened without vsync and pacing switches to 'hybrid' at fps.
+    Args:
+        strategy (str): 'sleep', 'busy', 'hybrid' or 'vsync'.
+        fps (int): Target frame rate; 0 doesn't wait at all.
+        clock (pygame.time.Clock): Used by 'sleep' and 'busy'.
+    """
+
+    def __init__(self, strategy, fps, clock):
+        self.strategy = strategy
+        self.fps = fps
+        self.clock = clock
+        self.period = 1.0 / fps if fps else 0.0
+        self.intervals = PhaseRing() # ns between the ends of successive frames
+        self.missed = 0 # Frames that took over 1.5 periods
+        self.presents = PhaseRing(VSYNC_PROBE_FRAMES) if strategy == 'vsync' else None # Flip times while probing
+        self.reset()
+
+    def reset(self):
+        """Forgets the last frame, e.g. after the loop sat idle, so the pause isn't counted as an interval."""
+        self.deadline = None
+        self.last_ns = None
+
+    def wait(self, present_ns=0):
+        """
+        Waits until the next frame is due and records the interval since the previous one.
+        Args:
+            present_ns (int): How long this frame's flip took; tells 'vsync' whether flips block.
+        """
+        if self.strategy == 'vsync':
+            pass # The flip already waited for the vertical blank
+        elif self.strategy == 'busy':
+            self.clock.tick_busy_loop(self.fps)
+        elif self.strategy == 'hybrid':
+            self._sleep_then_spin()
+        else:
+            self.clock.tick(self.fps)
+        now = time.perf_counter_ns()
+        if self.last_ns is not None:
+            profiler.end('interval', self.last_ns)
+            interval = now - self.last_ns
+            self.intervals.add(interval)
+            if self.period and interval > 1.5e9 * self.period:
+                self.missed += 1
+            if self.presents is not None:
+                self.presents.add(present_ns)
+                if self.presents.count == VSYNC_PROBE_FRAMES:
+                    self._end_vsync_probe()
+                    now = time.perf_counter_ns()
+        self.last_ns = now
+
+    def _end_vsync_probe(self):
+        """Keeps vsync, at the measured frame period, if flips block at a plausible refresh rate; otherwise leaves it."""
+        presents = self.presents
+        self.presents = None
+        interval = self.intervals.percentiles((50,))[0]
+        if interval < 1e9 / VSYNC_MAX_HZ or presents.percentiles((50,))[0] < VSYNC_BLOCK_SHARE * interval:
+            self._leave_vsync()
+            return
+        self.period = interval / 1e9 # The display's refresh period (or a multiple, if frames take longer)
+        self.fps = round(1.0 / self.period)
+        self.missed = sum(1 for ns in self.intervals.recent() if ns > 1.5 * interval)
+
+    def _leave_vsync(self):
+        """Reopens the window without vsync, so flips don't lock to the display under the hybrid schedule, and paces with 'hybrid'."""
+        global FRAME_PACING
+        print("Flips aren't waiting for vsync; pacing with 'hybrid' instead")
+        FRAME_PACING = 'hybrid'
+        init_display()
+        invalidate_dirty_rects() # The new window starts blank
+        self.strategy = 'hybrid'
+        self.clock = clock
+        self.intervals.count = 0 # Measure the new strategy from scratch
+        self.missed = 0
+        self.reset()
+
+    def _sleep_then_spin(self):
+        """Sleeps until PACING_SPIN_MS before the deadline, where OS timer slop doesn't matter, then spins."""
+        if not self.period:
+            return
+        now = time.perf_counter()
+        deadline = now if self.deadline is None else self.deadline + self.period
+        if deadline < now:
+            deadline = now # Running late: start the next frame now rather than rushing to catch up
+        remaining = deadline - now - PACING_SPIN_MS / 1000.0
+        if remaining > 0:
+            time.sleep(remaining)
+        while time.perf_counter() < deadline:
+            pass
+        self.deadline = deadline
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frame interval statistics over the recent frames, in ms: mean, stdev (the jitter),
+            p50/p99 of the absolute deviation from the target period, plus the count of missed frames.
+        """
+        intervals = [ns / 1e6 for ns in self.intervals.recent()]
+        if not intervals:
+            return {'frames': 0, 'missed': self.missed}
+        mean = sum(intervals) / len(intervals)
+        stdev = (sum((ms - mean) ** 2 for ms in intervals) / len(intervals)) ** 0.5
+        period_ms = self.period * 1000.0 if self.period else mean
+        deviations = sorted(abs(ms - period_ms) for ms in intervals)
+        return {
+            'frames': len(intervals),
+            'mean_ms': mean,
+            'stdev_ms': stdev,
+            'p50_deviation_ms': deviations[len(deviations) // 2],
+            'p99_deviation_ms': deviations[min(len(deviations) - 1, len(deviations) * 99 // 100)],
+            'missed': self.missed,
+        }
+
+
+pacer = None # The game loop's FramePacer; read pacer.stats() for the jitter of the current session
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                return False  # Signal to quit the entire application
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
-                    return True  # Signal to start the game
-                if event.key == pygame.K_ESCAPE:
-                    return False # Signal to quit
 
 # --- Main Game Loop ---
-if __name__ == "__main__":
-    if main_menu(): # Show main menu first
-        reset_game() # Initialize game state
-        running = True
-        while running:
-            # Event handling
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_p and not game_over: # Pause only if game not over
-                        game_paused = not game_paused
-                    elif game_over: # Only handle Y/N if game is over
-                        if event.key == pygame.K_y:
-                            reset_game() # Reset for a new game
-                        elif event.key == pygame.K_n:
-                            running = False # Quit to main menu (or exit)
-                    elif event.key == pygame.K_ESCAPE: # Allow ESC to pause or go to menu
-                        if game_paused:
-                            game_paused = False # Unpause
-                        elif not game_over: # If game is running, pause it
-                            game_paused = True
-                        # If game_over, ESC does nothing here (Y/N is primary)
-            
-            # Update game logic
-            update_game_state()
-            
-            # Draw everything
-            draw_elements()
-            
-            # Update the display
-            pygame.display.flip()
-            
-            # Cap the frame rate
-            clock.tick(60) # Target 60 FPS
+def play_game():
+    """Plays matches until the player quits."""
+    reset_game() # Initialize game state
+    sim_step_seconds = 1.0 / SIM_HZ
+    sim_step_ticks = TICK_RATE / SIM_HZ
+    accumulator = 0.0
+    last_time = time.perf_counter()
+    invalidate_dirty_rects() # The menu drew over the whole screen
+    drawn_idle_state = None
+    global pacer
+    pacer = FramePacer(FRAME_PACING, RENDER_FPS, clock)
+    governor = QualityGovernor(len(QUALITY_LEVELS) - 1, 1000.0 * (pacer.period or 1 / 60)) if QUALITY_GOVERNOR else None
+    running = True
+    while running:
+        if sim.paused or sim.game_over:
+            # Nothing moves: draw once, then block until an event changes something
+            if idle_state() != drawn_idle_state:
+                render_frame()
+                drawn_idle_state = idle_state()
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            if event.type in REDRAW_EVENTS:
+                update_viewport() # Also makes the next frame a full redraw
+                drawn_idle_state = None
+            elif event.type != pygame.NOEVENT:
+                running = handle_game_event(event)
+            # Don't let the idle time pile up as simulation backlog, or count as a frame interval
+            accumulator = 0.0
+            last_time = time.perf_counter()
+            pacer.reset()
+            continue
+        drawn_idle_state = None
+        frame_start = mark = profiler.mark()
+
+        # Event handling
+        for event in pygame.event.get():
+            if not handle_game_event(event):
+                running = False
+        mark = profiler.end('events', mark)
+        
+        # Update game logic in fixed steps for the real time that has passed
+        now = time.perf_counter()
+        accumulator += now - last_time
+        last_time = now
+        substeps = 0
+        while accumulator >= sim_step_seconds and substeps < MAX_SUBSTEPS:
+            update_game_state(sim_step_ticks)
+            accumulator -= sim_step_seconds
+            substeps += 1
+        if substeps == MAX_SUBSTEPS and accumulator >= sim_step_seconds:
+            accumulator = 0.0 # Too far behind: drop the backlog instead of spiralling
+        profiler.end('update', mark)
+        
+        # Draw everything, interpolated between the last two sim states
+        present_start = render_frame(accumulator / sim_step_seconds)
+        
+        # Pace the render rate
+        mark = profiler.mark()
+        if governor is not None:
+            # Time spent working, before the pacer waits; with vsync the flip itself waits, so stop before it
+            work_end = present_start if pacer.strategy == 'vsync' else mark
+            level = governor.observe(work_end - frame_start)
+            if level is not None:
+                apply_quality(level)
+        pacer.wait(mark - present_start)
+        if governor is not None and pacer.period:
+            governor.budget_ns = pacer.period * 1e9 # Under vsync the pacer settles on the display's period
+        profiler.end('tick', mark)
+        profiler.end('frame', frame_start)
+
+
+class App:
+    """
+    Brings the game up and runs it. Nothing is initialized until start(), which opens the window
+    and shows the menu while audio, the sound bank and fonts start on background threads.
+    """
 
-    # Cleanup
-    terminate_audio()
-    pygame.quit()
+    def __init__(self):
+        self.started = False
+        self.first_frame_time = None # time.time() when the first frame was presented
+
+    def start(self):
+        """Opens the window and shows the main menu. Does nothing if already started."""
+        global audio_closed
+        if self.started:
+            return
+        self.started = True
+        if TRACE_FILE is not None:
+            profiler.trace = TraceRecorder(TRACE_FILE)
+        # Audio doesn't need pygame, so it starts while pygame is still importing
+        audio_closed = False # Let init_audio() keep the device this time
+        start_subsystem('audio', init_audio) # Opening the device can take hundreds of ms
+        start_subsystem('sound_bank', build_sound_bank) # Synthesize effect buffers once, up front
+        import_pygame()
+        start_subsystem('fonts', load_fonts)
+        init_display()
+        if not subsystem_ready('fonts'):
+            pygame.display.flip() # Show the empty window while the fonts load
+        create_game_objects()
+        draw_menu()
+        self.first_frame_time = time.time()
+
+    def run(self):
+        """Starts the game if needed and plays until the player quits."""
+        self.start()
+        if main_menu(): # Show main menu first
+            play_game()
+        self.shutdown()
+
+    def shutdown(self):
+        """Closes audio and the window, and writes any requested profile or trace."""
+        for name in subsystems:
+            wait_for_subsystem(name, SUBSYSTEM_SHUTDOWN_WAIT) # Don't close audio while it is still opening
+        terminate_audio()
+        if PROFILE_CSV is not None:
+            try:
+                profiler.dump_csv(PROFILE_CSV)
+            except OSError as e:
+                print(f"Could not write profile: {e}")
+        if profiler.trace is not None:
+            profiler.trace.close()
+            profiler.trace = None
+        pygame.quit()
+        self.started = False
+
+
+if __name__ == "__main__":
+    App().run()
     sys.exit()
@@ -0,0 +1,288 @@
+"""
+Frame phase profiler for Ultra!Pong HDR.
+
+Each phase of the main loop (events, update, draw, present, tick) records its duration
+in nanoseconds into a fixed-size ring buffer, so profiling allocates nothing per frame
+and always covers the most recent PROFILE_SAMPLES frames. Phases timed on other threads,
+like the audio callback, get their own ring. Percentiles are computed only when asked for.
+
+For timelines, a TraceRecorder attached to the profiler also logs every phase and
+instant event (e.g. sound triggers) as Chrome trace JSON, which chrome://tracing and
+Perfetto open directly.
+
+QualityGovernor turns the same kind of measurements into decisions: it steps a quality
+level down when frames run over budget and back up when there is headroom.
+"""
+import queue
+import threading
+import time
+from array import array
+
+PROFILE_SAMPLES = 600  # Samples kept per phase (10 s at 60 FPS)
+PERCENTILES = (50, 95, 99)
+TRACE_BUFFER_EVENTS = 16384  # Events per trace buffer; two are allocated up front
+TRACE_FLUSH_NS = 1_000_000_000  # Hand the events recorded so far to the writer at least this often
+GOVERNOR_WINDOW = 60  # Frames measured before each quality decision
+GOVERNOR_PERCENTILE = 90  # The frame time percentile compared with the budget
+GOVERNOR_OVER = 0.9  # Step down when that percentile exceeds this share of the budget...
+GOVERNOR_HEADROOM = 0.5  # ...and up when it is under this share
+GOVERNOR_UP_WINDOWS = 3  # Consecutive windows with headroom needed to step up
+
+
+class PhaseRing:
+    """
+    The last `capacity` durations of one phase, in ns. add() is O(1) and allocation-free.
+    A single writer thread per ring is assumed; readers may run on any thread.
+    """
+    __slots__ = ('samples', 'capacity', 'count')
+
+    def __init__(self, capacity=PROFILE_SAMPLES):
+        self.samples = array('q', bytes(8 * capacity))
+        self.capacity = capacity
+        self.count = 0  # Total samples ever added
+
+    def add(self, duration_ns):
+        self.samples[self.count % self.capacity] = duration_ns
+        self.count += 1
+
+    def recent(self):
+        """Returns the samples held, oldest first, as a list."""
+        count = self.count
+        if count <= self.capacity:
+            return self.samples[:count].tolist()
+        split = count % self.capacity
+        return self.samples[split:].tolist() + self.samples[:split].tolist()
+
+    def percentiles(self, percents=PERCENTILES):
+        """Nearest-rank percentiles of the samples held, in ns (all 0 if there are none)."""
+        ordered = sorted(self.recent())
+        if not ordered:
+            return [0] * len(percents)
+        last = len(ordered) - 1
+        return [ordered[min(last, (len(ordered) * p + 99) // 100 - 1)] if p else ordered[0] for p in percents]
+
+
+class FrameProfiler:
+    """
+    A PhaseRing per named phase, created on first use. Phases are timed by chaining marks:
+        mark = profiler.mark()
+        handle_events()
+        mark = profiler.end('events', mark)
+        update()
+        mark = profiler.end('update', mark)
+    Counters (e.g. audio underflows) count occurrences instead of timing them.
+    """
+
+    def __init__(self, capacity=PROFILE_SAMPLES):
+        self.capacity = capacity
+        self.phases = {}  # Phase name -> PhaseRing, in first-use order
+        self.counters = {}
+        self.trace = None  # TraceRecorder that also gets every phase and event, if tracing
+
+    @staticmethod
+    def mark():
+        """The current time in ns, to pass to end()."""
+        return time.perf_counter_ns()
+
+    def end(self, phase, start_ns):
+        """Records the time since start_ns under phase and returns the current time, to start the next phase."""
+        now = time.perf_counter_ns()
+        ring = self.phases.get(phase)
+        if ring is None:
+            ring = self.phases[phase] = PhaseRing(self.capacity)
+        ring.add(now - start_ns)
+        if self.trace is not None:
+            self.trace.add(phase, start_ns, now - start_ns)
+        return now
+
+    def event(self, name):
+        """Marks an instant (e.g. a sound trigger) on the trace timeline; does nothing unless tracing."""
+        if self.trace is not None:
+            self.trace.add(name, time.perf_counter_ns(), -1)
+
+    def count(self, counter, n=1):
+        """Adds n to a named counter."""
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def summary(self, percents=PERCENTILES):
+        """Returns [(phase, [percentile ms...])] for every phase, in first-use order."""
+        return [(phase, [ns / 1e6 for ns in ring.percentiles(percents)])
+                for phase, ring in list(self.phases.items())]
+
+    def dump_csv(self, path):
+        """
+        Writes every sample held to path as CSV (phase, sample, duration_us), oldest first per phase,
+        followed by the counters as (counter, total, '').
+        """
+        with open(path, 'w', newline='') as csv_file:
+            csv_file.write("phase,sample,duration_us\n")
+            for phase, ring in list(self.phases.items()):
+                first = max(0, ring.count - ring.capacity)
+                for i, ns in enumerate(ring.recent()):
+                    csv_file.write(f"{phase},{first + i},{ns / 1000:.1f}\n")
+            for counter, total in list(self.counters.items()):
+                csv_file.write(f"{counter},{total},\n")
+
+
+class _TraceBuffer:
+    """Preallocated columns for TRACE_BUFFER_EVENTS events: name id, start ns, duration ns (-1 = instant), thread id."""
+    __slots__ = ('names', 'starts', 'durations', 'threads', 'count')
+
+    def __init__(self, capacity):
+        self.names = array('H', bytes(2 * capacity))
+        self.starts = array('q', bytes(8 * capacity))
+        self.durations = array('q', bytes(8 * capacity))
+        self.threads = array('H', bytes(2 * capacity))
+        self.count = 0
+
+
+class TraceRecorder:
+    """
+    Records timed phases and instant events into one of two preallocated buffers. When the
+    active buffer fills, or every TRACE_FLUSH_NS, it is swapped for the spare and a background
+    thread appends it to the file as Chrome trace JSON. Recording never waits for the disk:
+    if the writer still holds the spare when a swap is due, new events are dropped and counted.
+    The file uses the JSON array form, which trace viewers load even if the game dies before close().
+    Args:
+        path (str): The .json file to write.
+        capacity (int): Events per buffer.
+    """
+
+    def __init__(self, path, capacity=TRACE_BUFFER_EVENTS):
+        self.path = path
+        self.capacity = capacity
+        self.dropped = 0  # Events lost because the writer fell behind
+        self._lock = threading.Lock()  # add() runs on the game and audio threads
+        self._names = {}  # Event name -> id
+        self._name_list = []
+        self._threads = {}  # Thread -> (tid, thread name); not keyed by ident, which a new thread may reuse
+        self._origin = time.perf_counter_ns()
+        self._last_swap = self._origin
+        self._active = _TraceBuffer(capacity)
+        self._spare = queue.Queue()
+        self._spare.put(_TraceBuffer(capacity))
+        self._full = queue.Queue()
+        self._file = open(path, 'w')
+        self._file.write("[\n")
+        self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def add(self, name, start_ns, duration_ns):
+        """Records an event; a duration of -1 marks an instant."""
+        current = threading.current_thread()
+        with self._lock:
+            buffer = self._active
+            if buffer.count == self.capacity or start_ns - self._last_swap >= TRACE_FLUSH_NS:
+                if not self._swap():
+                    if buffer.count == self.capacity:
+                        self.dropped += 1
+                        return
+                buffer = self._active
+            name_id = self._names.get(name)
+            if name_id is None:
+                name_id = self._names[name] = len(self._name_list)
+                self._name_list.append(name)
+            thread = self._threads.get(current)
+            if thread is None:
+                thread = self._threads[current] = (len(self._threads) + 1, current.name)
+            i = buffer.count
+            buffer.names[i] = name_id
+            buffer.starts[i] = start_ns
+            buffer.durations[i] = duration_ns
+            buffer.threads[i] = thread[0]
+            buffer.count = i + 1
+
+    def _swap(self):
+        """Hands the active buffer to the writer if the spare is free. Call with the lock held."""
+        try:
+            spare = self._spare.get_nowait()
+        except queue.Empty:
+            return False
+        self._full.put(self._active)
+        self._active = spare
+        self._last_swap = time.perf_counter_ns()
+        return True
+
+    def _write_loop(self):
+        names = self._name_list
+        origin = self._origin
+        while True:
+            buffer = self._full.get()
+            if buffer is None:
+                break
+            lines = []
+            for i in range(buffer.count):
+                ts = (buffer.starts[i] - origin) / 1000
+                duration = buffer.durations[i]
+                if duration < 0:
+                    lines.append(f'{{"name":"{names[buffer.names[i]]}","ph":"i","s":"t","ts":{ts:.3f},'
+                                 f'"pid":1,"tid":{buffer.threads[i]}}},\n')
+                else:
+                    lines.append(f'{{"name":"{names[buffer.names[i]]}","ph":"X","ts":{ts:.3f},'
+                                 f'"dur":{duration / 1000:.3f},"pid":1,"tid":{buffer.threads[i]}}},\n')
+            self._file.write("".join(lines))
+            self._file.flush()
+            buffer.count = 0
+            self._spare.put(buffer)
+
+    def close(self):
+        """Writes the remaining events and thread names, and closes the file."""
+        with self._lock:
+            last = self._active
+            self._active = _TraceBuffer(0)  # Late events from other threads are dropped
+            self.capacity = 0
+        self._full.put(last)
+        self._full.put(None)
+        self._writer.join()
+        for tid, thread_name in list(self._threads.values()):
+            self._file.write(f'{{"name":"thread_name","ph":"M","pid":1,"tid":{tid},"args":{{"name":"{thread_name}"}}}},\n')
+        self._file.write('{"name":"process_name","ph":"M","pid":1,"args":{"name":"Ultra!Pong HDR"}}\n]\n')
+        self._file.close()
+
+
+class QualityGovernor:
+    """
+    Picks a quality level in [0, max_level] from rolling frame times. Every `window` frames,
+    it compares a high percentile of the frame time with the budget. It steps down one level
+    as soon as a window runs over, and steps up only after GOVERNOR_UP_WINDOWS windows in a row
+    with headroom, so it doesn't oscillate around the limit.
+    Pass the time a frame spent working, not sleeping to cap the frame rate.
+    Args:
+        max_level (int): The highest (and starting) level.
+        budget_ms (float): Frame time budget, e.g. 1000 / target FPS.
+        window (int): Frames per decision.
+    """
+
+    def __init__(self, max_level, budget_ms, window=GOVERNOR_WINDOW):
+        self.max_level = max_level
+        self.level = max_level
+        self.budget_ns = budget_ms * 1e6
+        self.frames = PhaseRing(window)
+        self.headroom_windows = 0
+
+    def observe(self, frame_ns):
+        """
+        Records one frame's working time.
+        Returns:
+            int | None: The new level if it changed, else None.
+        """
+        frames = self.frames
+        frames.add(frame_ns)
+        if frames.count < frames.capacity:
+            return None
+        load = frames.percentiles((GOVERNOR_PERCENTILE,))[0]
+        frames.count = 0  # Each decision is based only on frames rendered at the current level
+        if load > self.budget_ns * GOVERNOR_OVER:
+            self.headroom_windows = 0
+            if self.level > 0:
+                self.level -= 1
+                return self.level
+        elif load < self.budget_ns * GOVERNOR_HEADROOM:
+            self.headroom_windows += 1
+            if self.headroom_windows >= GOVERNOR_UP_WINDOWS and self.level < self.max_level:
+                self.headroom_windows = 0
+                self.level += 1
+                return self.level
+        else:
+            self.headroom_windows = 0
+        return None
@@ -0,0 +1,274 @@
+"""
+Compact binary replays for Ultra!Pong HDR.
+
+A match is fully determined by its seed (see PongSim.reset_game), the AI opponent and
+the player's paddle input on every tick, so that is all a replay needs. Inputs are whole-pixel
+y values, delta-encoded as int16 in an array and optionally zlib-compressed.
+Every KEYFRAME_INTERVAL ticks the full sim state is stored as well, with an index,
+so ReplayPlayer can seek to any tick by restoring the nearest keyframe and
+re-simulating at most KEYFRAME_INTERVAL - 1 ticks.
+
+File layout (little-endian):
+    header     magic b'UPRP', version u8, flags u8, seed u32, dt f64, tick count u32,
+               input body size u32, keyframe count u32, AI code u8 (see AI_CODES)
+    inputs     tick count int16 deltas (zlib-compressed if FLAG_ZLIB is set)
+    keyframes  keyframe count fixed-size records: a KEYFRAME, followed by the PredictiveAI's
+               AI_STATE when the match was played against one
+    index      keyframe count (tick u32, offset of the record from the start of the file u32)
+"""
+import bisect
+import struct
+import sys
+import zlib
+from array import array
+
+from pongsim import AI_STATE, GAME_STATE, PongSim, PredictiveAI
+
+REPLAY_MAGIC = b'UPRP'
+REPLAY_VERSION = 1
+FLAG_ZLIB = 1
+HEADER = struct.Struct('<4sBBIdIIIB')
+INDEX_ENTRY = struct.Struct('<II')
+INPUT_MIN = -16384  # Inputs are clamped so every delta fits in an int16
+INPUT_MAX = 16383
+KEYFRAME_INTERVAL = 600  # Ticks between keyframes; bounds the re-simulation on a seek
+KEYFRAME = GAME_STATE  # A keyframe is a PongSim snapshot (GameState.snapshot())
+AI_CODES = {None: 0, 'easy': 1, 'normal': 2, 'hard': 3, 'perfect': 4}  # None is the original ball-chasing AI
+AI_NAMES = {code: name for name, code in AI_CODES.items()}
+
+
+def keyframe_size(ai_difficulty):
+    """Bytes per keyframe record in a replay against the given AI (None = the original AI)."""
+    return KEYFRAME.size + (AI_STATE.size if ai_difficulty is not None else 0)
+
+
+class ReplayError(ValueError):
+    """Raised when replay data is malformed or from an unsupported version."""
+
+
+class ReplayRecorder:
+    """
+    Records the player inputs of one match. record() is O(1): one subtraction and one array
+    append, plus a small struct pack every keyframe_interval ticks when a sim is attached.
+    Args:
+        seed (int): The match seed (PongSim.seed after reset_game()).
+        dt (float): Ticks advanced per PongSim.step() call.
+        sim (PongSim | None): The match being recorded; needed to store keyframes.
+        keyframe_interval (int): Steps between keyframes.
+        ai (PredictiveAI | None): The opponent steering the AI paddle; None is the original AI.
+    """
+    __slots__ = ('seed', 'dt', 'deltas', 'last', 'sim', 'keyframe_interval', 'keyframes', 'ai')
+
+    def __init__(self, seed, dt=1.0, sim=None, keyframe_interval=KEYFRAME_INTERVAL, ai=None):
+        self.seed = seed
+        self.dt = dt
+        self.deltas = array('h')
+        self.last = 0
+        self.sim = sim
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = []  # Snapshots, keyframe i taken before step i * keyframe_interval
+        self.ai = ai
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def record(self, player_y):
+        """
+        Records the player input for one step, before the step and before the AI's target() for it.
+        Returns:
+            int: The input as stored: whole pixels, clamped. Pass this to PongSim.step(), not the raw
+            value, so the replay reproduces the match exactly.
+        """
+        if self.sim is not None and len(self.deltas) % self.keyframe_interval == 0:
+            keyframe = self.sim.snapshot()
+            if self.ai is not None:
+                keyframe += self.ai.snapshot()
+            self.keyframes.append(keyframe)
+        value = int(player_y)
+        if value < INPUT_MIN:
+            value = INPUT_MIN
+        elif value > INPUT_MAX:
+            value = INPUT_MAX
+        self.deltas.append(value - self.last)
+        self.last = value
+        return value
+
+    def to_bytes(self, compress=True):
+        """Serializes the replay."""
+        deltas = self.deltas
+        if sys.byteorder == 'big':
+            deltas = array('h', deltas)
+            deltas.byteswap()
+        body = deltas.tobytes()
+        if compress:
+            body = zlib.compress(body, 9)
+        flags = FLAG_ZLIB if compress else 0
+        ai_difficulty = None if self.ai is None else self.ai.difficulty
+        record_size = keyframe_size(ai_difficulty)
+        keyframe_start = HEADER.size + len(body)
+        index = b''.join(INDEX_ENTRY.pack(i * self.keyframe_interval, keyframe_start + i * record_size)
+                         for i in range(len(self.keyframes)))
+        return b''.join([HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, flags, self.seed, self.dt, len(self.deltas),
+                                     len(body), len(self.keyframes), AI_CODES[ai_difficulty]),
+                         body, *self.keyframes, index])
+
+    def save(self, path, compress=True):
+        """Writes the replay to path."""
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.to_bytes(compress))
+
+
+class Replay:
+    """
+    A loaded replay: the match seed, the step length, the AI difficulty (None for the original
+    AI), the player input for every step, and keyframes as (tick, keyframe record) pairs sorted by tick.
+    """
+    __slots__ = ('seed', 'dt', 'inputs', 'keyframes', 'ai_difficulty')
+
+    def __init__(self, seed, dt, inputs, keyframes=(), ai_difficulty=None):
+        self.seed = seed
+        self.dt = dt
+        self.inputs = inputs  # array('h') of absolute player inputs, one per step
+        self.keyframes = list(keyframes)
+        self.ai_difficulty = ai_difficulty
+
+    def __len__(self):
+        return len(self.inputs)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Parses replay data produced by ReplayRecorder.to_bytes()."""
+        data = memoryview(data)
+        if len(data) < HEADER.size:
+            raise ReplayError("replay data is truncated")
+        magic, version, flags, seed, dt, count, body_size, keyframe_count, ai_code = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ReplayError("not a replay file")
+        if version != REPLAY_VERSION:
+            raise ReplayError(f"unsupported replay version {version}")
+        body = data[HEADER.size:HEADER.size + body_size]
+        if ai_code not in AI_NAMES:
+            raise ReplayError(f"unknown AI code {ai_code}")
+        ai_difficulty = AI_NAMES[ai_code]
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        deltas = array('h')
+        deltas.frombytes(body)
+        if sys.byteorder == 'big':
+            deltas.byteswap()
+        if len(deltas) != count:
+            raise ReplayError(f"expected {count} inputs, found {len(deltas)}")
+        inputs = array('h', bytes(2 * count))
+        value = 0
+        for i, delta in enumerate(deltas):
+            value += delta
+            inputs[i] = value
+
+        keyframes = []
+        if keyframe_count:
+            record_size = keyframe_size(ai_difficulty)
+            index_start = len(data) - keyframe_count * INDEX_ENTRY.size
+            for i in range(keyframe_count):
+                tick, offset = INDEX_ENTRY.unpack_from(data, index_start + i * INDEX_ENTRY.size)
+                if offset + record_size > index_start:
+                    raise ReplayError("keyframe index points outside the keyframe section")
+                keyframes.append((tick, data[offset:offset + record_size]))  # Zero-copy view
+        return cls(seed, dt, inputs, keyframes, ai_difficulty)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a replay file."""
+        with open(path, 'rb') as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+    def make_ai(self, sim):
+        """The opponent the match was played against, steering sim's AI paddle, or None for the original AI."""
+        return None if self.ai_difficulty is None else PredictiveAI(sim, self.ai_difficulty)
+
+    def simulate(self, sim=None):
+        """Re-runs the whole match headlessly and returns the PongSim in its final state."""
+        if sim is None:
+            sim = PongSim()
+        sim.reset_game(self.seed)
+        ai = self.make_ai(sim)
+        step = sim.step
+        dt = self.dt
+        if ai is None:
+            for player_y in self.inputs:
+                step(player_y, dt=dt)
+        else:
+            target = ai.target
+            for player_y in self.inputs:
+                step(player_y, target(), dt)
+        return sim
+
+
+class ReplayPlayer:
+    """
+    Headless playback of a Replay with random access. seek() restores the nearest keyframe
+    at or before the target tick and re-simulates the rest; replays recorded without a sim,
+    and so without keyframes, get them built by one fast-forward pass when the player is created.
+    Args:
+        replay (Replay): The replay to play.
+        keyframe_interval (int): Spacing of keyframes built for replays that have none.
+    """
+
+    def __init__(self, replay, keyframe_interval=KEYFRAME_INTERVAL):
+        self.replay = replay
+        self.sim = PongSim()
+        self.ai = replay.make_ai(self.sim)
+        if not replay.keyframes:
+            replay.keyframes = self._build_keyframes(keyframe_interval)
+        self.keyframe_ticks = [tick for tick, _ in replay.keyframes]
+        self.sim.reset_game(replay.seed)
+        self.ai = replay.make_ai(self.sim)
+        self.tick = 0  # Steps of the replay applied to self.sim
+
+    def _build_keyframes(self, interval):
+        sim = self.sim
+        sim.reset_game(self.replay.seed)
+        keyframes = []
+        dt = self.replay.dt
+        ai = self.ai
+        for tick, player_y in enumerate(self.replay.inputs):
+            if tick % interval == 0:
+                keyframes.append((tick, sim.snapshot() if ai is None else sim.snapshot() + ai.snapshot()))
+            sim.step(player_y, None if ai is None else ai.target(), dt)
+        return keyframes
+
+    def __len__(self):
+        return len(self.replay)
+
+    def seek(self, tick):
+        """Puts the sim in its state after `tick` steps of the replay."""
+        tick = max(0, min(tick, len(self.replay)))
+        i = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        # Restore the nearest keyframe, unless running forward from the current tick is shorter
+        if tick < self.tick or (i >= 0 and self.keyframe_ticks[i] > self.tick):
+            if i >= 0:
+                self.tick, record = self.replay.keyframes[i]
+                self.sim.restore(record)
+                if self.ai is not None:
+                    self.ai.restore(record, KEYFRAME.size)
+            else:
+                self.sim.reset_game(self.replay.seed)
+                if self.ai is not None:
+                    self.ai = self.replay.make_ai(self.sim)
+                self.tick = 0
+        self.advance(tick - self.tick)
+
+    def advance(self, ticks=1):
+        """
+        Fast-forwards up to `ticks` steps without rendering.
+        Returns:
+            int: The EVENT_* flags of all the steps, OR-ed together.
+        """
+        end = min(self.tick + ticks, len(self.replay))
+        step = self.sim.step
+        dt = self.replay.dt
+        ai = self.ai
+        events = 0
+        for player_y in self.replay.inputs[self.tick:end]:
+            events |= step(player_y, None if ai is None else ai.target(), dt)
+        self.tick = end
+        return events
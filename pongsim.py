@@ -0,0 +1,549 @@
+"""
+Headless Pong rules for Ultra!Pong HDR.
+
+Pure Python: no pygame, no display, no audio. PongSim holds the complete state
+of one match and advances it with step(); the interactive game in ponghdrv0.py
+is a thin shell that feeds it mouse input, plays sounds for the returned events
+and draws the result. Tooling (tests, AI training, analysis) can import this
+module directly and run hundreds of thousands of steps per second.
+"""
+import math
+import random
+import struct
+
+# --- Game Constants ---
+TICK_RATE = 60  # Speeds are in px per tick; one tick is 1/60 s of game time
+SCREEN_WIDTH = 600
+SCREEN_HEIGHT = 400
+PADDLE_WIDTH = 15
+PADDLE_HEIGHT = 80
+PADDLE_MARGIN = 30  # Gap between each paddle and its edge of the screen
+BALL_RADIUS = 8
+AI_PADDLE_SPEED = 6  # Renamed from PADDLE_SPEED and slightly adjusted
+BALL_SPEED_X_INITIAL = 4 # Slightly reduced initial speed for better control
+BALL_SPEED_Y_INITIAL = 4
+
+# Gameplay enhancement constants
+WINNING_SCORE = 5
+PADDLE_HIT_SPEED_INCREASE_FACTOR = 1.07 # How much speed increases on paddle hit
+MAX_ABS_BALL_SPEED_X = 10             # Maximum horizontal ball speed
+PADDLE_BOUNCE_ANGLE_FACTOR = 1.7      # Multiplier for Y speed based on paddle hit location
+MAX_ABS_BALL_SPEED_Y = 8              # Maximum vertical ball speed
+
+# Events reported by PongSim.step(), as bit flags
+EVENT_PADDLE_HIT = 1
+EVENT_WALL_HIT = 2
+EVENT_SCORE = 4
+EVENT_GAME_OVER = 8
+
+# Collision sweeping: at most this many bounces are resolved within one step
+MAX_SWEEP_EVENTS = 8
+INF = float('inf')
+# What the ball meets first during a sweep
+KIND_PLAYER_PADDLE = 0
+KIND_AI_PADDLE = 1
+KIND_WALL = 2
+KIND_GOAL = 3
+
+
+def sweep_aabb(x, y, vx, vy, xmin, xmax, ymin, ymax, limit):
+    """
+    Time of impact of a point moving from (x, y) at (vx, vy) with the open box (xmin, xmax) x (ymin, ymax).
+    To sweep one box against another, pass the target grown by the moving box's size (its Minkowski sum).
+    Returns:
+        float: First time in [0, limit) at which the point is strictly inside the box, or INF if it never is.
+    """
+    t_enter = 0.0
+    t_exit = limit
+    if vx == 0:
+        if not xmin < x < xmax:
+            return INF
+    else:
+        t1 = (xmin - x) / vx
+        t2 = (xmax - x) / vx
+        if t1 > t2:
+            t1, t2 = t2, t1
+        if t1 > t_enter:
+            t_enter = t1
+        if t2 < t_exit:
+            t_exit = t2
+    if vy == 0:
+        if not ymin < y < ymax:
+            return INF
+    else:
+        t1 = (ymin - y) / vy
+        t2 = (ymax - y) / vy
+        if t1 > t2:
+            t1, t2 = t2, t1
+        if t1 > t_enter:
+            t_enter = t1
+        if t2 < t_exit:
+            t_exit = t2
+    return t_enter if t_enter < t_exit else INF
+
+
+def _sweep_paddle(x, y, vx, vy, ball, paddle, limit):
+    """Time of impact of the ball, with its top-left corner at (x, y), against a paddle."""
+    return sweep_aabb(x, y, vx, vy, paddle.x - ball.w, paddle.x + paddle.w,
+                      paddle.y - ball.h, paddle.y + paddle.h, limit)
+
+
+def _time_to_bounds(pos, speed, low, high, limit):
+    """Time until pos, moving at speed, reaches low or high (touching counts), or INF if not within limit."""
+    if speed < 0:
+        t = (low - pos) / speed
+    elif speed > 0:
+        t = (high - pos) / speed
+    else:
+        return INF
+    if t > limit:
+        return INF
+    return t if t > 0.0 else 0.0
+
+
+class Body:
+    """
+    Axis-aligned box with sub-pixel float position (top-left corner) and velocity in px per tick.
+    The rules never round; pygame.Rects are derived from bodies only when drawing.
+    """
+    __slots__ = ('x', 'y', 'w', 'h', 'vx', 'vy')
+
+    def __init__(self, x, y, w, h, vx=0.0, vy=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.w = w
+        self.h = h
+        self.vx = float(vx)
+        self.vy = float(vy)
+
+    @property
+    def right(self):
+        return self.x + self.w
+
+    @property
+    def bottom(self):
+        return self.y + self.h
+
+    @property
+    def centerx(self):
+        return self.x + self.w / 2
+
+    @property
+    def centery(self):
+        return self.y + self.h / 2
+
+    @centery.setter
+    def centery(self, value):
+        self.y = value - self.h / 2
+
+    def clamp_y(self, height):
+        """Keep the body inside [0, height] vertically."""
+        if self.y < 0.0:
+            self.y = 0.0
+        elif self.y + self.h > height:
+            self.y = float(height - self.h)
+
+
+MASK64 = (1 << 64) - 1
+
+
+class SplitMixRandom:
+    """
+    Small deterministic RNG (SplitMix64). Its whole state is one 64-bit int, so it can be stored
+    in keyframes and snapshots at a fixed size, unlike random.Random's 2.5 KB state.
+    Implements the subset of the random.Random API the game uses.
+    """
+    __slots__ = ('state',)
+
+    def __init__(self, seed=0):
+        self.state = seed & MASK64
+
+    def next64(self):
+        """Returns the next 64 random bits as an int."""
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def getrandbits(self, k):
+        """Returns an int with k (at most 64) random bits."""
+        return self.next64() >> (64 - k)
+
+    def random(self):
+        """Returns a float in [0, 1)."""
+        return (self.next64() >> 11) * (1.0 / 9007199254740992.0)
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def choice(self, seq):
+        return seq[int(self.random() * len(seq))]
+
+
+# Fixed layout of GameState.snapshot(): ball x, y, vx, vy, player y, AI y, time, RNG state, seed,
+# trajectory id, player score, AI score, paused, game over, winner
+GAME_STATE = struct.Struct('<7dQIIHHBBB')
+WINNER_CODES = {"": 0, "Player": 1, "AI": 2}
+WINNER_NAMES = {code: name for name, code in WINNER_CODES.items()}
+
+
+class GameState:
+    """
+    Everything that changes during a match: ball, paddles, scores, pause/game-over flags,
+    clock and RNG. snapshot() packs it into a fixed-size GAME_STATE record and restore()
+    loads one back, so states can be kept by the thousand for rollback or search, or written
+    to disk to resume a match, without pickling.
+    Args:
+        seed (int | None): Seeds the stream that match seeds are drawn from; None uses OS entropy.
+    """
+    __slots__ = ('rng', 'seed', 'player_paddle', 'ai_paddle', 'ball', 'player_score', 'ai_score',
+                 'paused', 'game_over', 'winner', 'time', 'trajectory_id')
+
+    def __init__(self, seed=None):
+        self.rng = SplitMixRandom(random.getrandbits(64) if seed is None else seed)
+        self.seed = None  # Seed of the current match, set by reset_game()
+        # Player paddle (left side)
+        self.player_paddle = Body(PADDLE_MARGIN, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2, PADDLE_WIDTH, PADDLE_HEIGHT)
+        # AI paddle (right side)
+        self.ai_paddle = Body(SCREEN_WIDTH - PADDLE_MARGIN - PADDLE_WIDTH, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2,
+                              PADDLE_WIDTH, PADDLE_HEIGHT)
+        # Ball
+        self.ball = Body(SCREEN_WIDTH // 2 - BALL_RADIUS, SCREEN_HEIGHT // 2 - BALL_RADIUS, BALL_RADIUS * 2, BALL_RADIUS * 2,
+                         BALL_SPEED_X_INITIAL, BALL_SPEED_Y_INITIAL)
+        self.player_score = 0
+        self.ai_score = 0
+        self.paused = False
+        self.game_over = False
+        self.winner = ""
+        self.time = 0.0  # Ticks simulated so far
+        self.trajectory_id = 0  # Bumped whenever the ball's path changes other than by a wall bounce
+
+    def snapshot(self):
+        """Returns the state as a GAME_STATE.size-byte record."""
+        buffer = bytearray(GAME_STATE.size)
+        self.snapshot_into(buffer)
+        return bytes(buffer)
+
+    def snapshot_into(self, buffer, offset=0):
+        """Packs the state into a writable buffer (bytearray, memoryview, mmap) at offset, without allocating."""
+        ball = self.ball
+        GAME_STATE.pack_into(buffer, offset, ball.x, ball.y, ball.vx, ball.vy, self.player_paddle.y, self.ai_paddle.y,
+                             self.time, self.rng.state, self.seed or 0, self.trajectory_id, self.player_score,
+                             self.ai_score, self.paused, self.game_over, WINNER_CODES[self.winner])
+
+    def restore(self, data, offset=0):
+        """Loads a record written by snapshot() or snapshot_into() from any bytes-like object at offset."""
+        (ball_x, ball_y, ball_vx, ball_vy, player_y, ai_y, self.time, self.rng.state, self.seed, self.trajectory_id,
+         self.player_score, self.ai_score, paused, game_over, winner) = GAME_STATE.unpack_from(data, offset)
+        ball = self.ball
+        ball.x, ball.y, ball.vx, ball.vy = ball_x, ball_y, ball_vx, ball_vy
+        self.player_paddle.y = player_y
+        self.ai_paddle.y = ai_y
+        self.paused = bool(paused)
+        self.game_over = bool(game_over)
+        self.winner = WINNER_NAMES[winner]
+
+
+class PongSim(GameState):
+    """
+    The rules that advance a GameState (ball, paddles, scores, pause/game-over flags) by one step.
+    All randomness comes from a per-match SplitMixRandom seeded in reset_game(), so a match is
+    reproduced exactly by its seed plus its per-tick inputs.
+    Args:
+        seed (int | None): Seeds the stream that match seeds are drawn from; None uses OS entropy.
+    """
+    __slots__ = ()
+
+    def center_ball(self):
+        """Puts the ball back in the middle of the court."""
+        self.trajectory_id += 1
+        self.ball.x = SCREEN_WIDTH / 2 - self.ball.w / 2
+        self.ball.y = SCREEN_HEIGHT / 2 - self.ball.h / 2
+
+    def reset_ball(self, served_by_player_next):
+        """
+        Resets the ball to the center and sets its initial speed and direction.
+        Args:
+            served_by_player_next (bool): True if the player serves next, False if AI serves.
+        """
+        self.center_ball()
+        self.ball.vx = float(BALL_SPEED_X_INITIAL if served_by_player_next else -BALL_SPEED_X_INITIAL)
+        # Alternate y direction for variety on serve
+        self.ball.vy = float(BALL_SPEED_Y_INITIAL) if self.rng.choice([True, False]) else float(-BALL_SPEED_Y_INITIAL)
+
+    def reset_game(self, seed=None):
+        """
+        Resets the match to its initial state and reseeds its RNG.
+        Args:
+            seed (int | None): 32-bit seed for the new match; None draws one from the previous match's RNG.
+        """
+        if seed is None:
+            seed = self.rng.getrandbits(32)
+        self.seed = seed
+        self.rng = SplitMixRandom(seed)
+        self.player_score = 0
+        self.ai_score = 0
+        self.game_over = False
+        self.winner = ""
+        self.paused = False
+        # Reset paddle positions
+        self.player_paddle.centery = SCREEN_HEIGHT // 2
+        self.ai_paddle.centery = SCREEN_HEIGHT // 2
+        # Decide who serves first in a new game (randomly)
+        self.reset_ball(self.rng.choice([True, False]))
+        self.time = 0.0
+
+    def step(self, player_y, ai_y=None, dt=1.0):
+        """
+        Advances the match by dt ticks (1 tick = 1/TICK_RATE s; speeds are in px per tick).
+        The ball is swept along its path, so it cannot tunnel through a paddle at any speed or dt.
+        Args:
+            player_y (float): Requested center y of the player paddle (e.g. the mouse y).
+            ai_y (float | None): Center y the AI paddle should move toward; None follows the ball (the simple AI).
+            dt (float): Length of the step in ticks.
+        Returns:
+            int: EVENT_* bit flags for what happened during the step (0 if nothing, or if paused/over).
+        """
+        if self.paused or self.game_over:
+            return 0
+
+        events = 0
+        ball = self.ball
+        player_paddle = self.player_paddle
+        ai_paddle = self.ai_paddle
+        max_x = SCREEN_WIDTH - ball.w
+        max_y = SCREEN_HEIGHT - ball.h
+
+        # --- Ball Movement ---
+        # Move to the earliest collision in the step, respond, and continue with the time left.
+        x = ball.x
+        y = ball.y
+        remaining = dt
+        hit_paddle = False
+        for _ in range(MAX_SWEEP_EVENTS):
+            vx = ball.vx
+            vy = ball.vy
+            t_hit, kind = _sweep_paddle(x, y, vx, vy, ball, player_paddle, remaining), KIND_PLAYER_PADDLE
+            t = _sweep_paddle(x, y, vx, vy, ball, ai_paddle, remaining)
+            if t < t_hit:
+                t_hit, kind = t, KIND_AI_PADDLE
+            t = _time_to_bounds(y, vy, 0, max_y, remaining)
+            if t < t_hit:
+                t_hit, kind = t, KIND_WALL
+            t = _time_to_bounds(x, vx, 0, max_x, remaining)
+            if t < t_hit:
+                t_hit, kind = t, KIND_GOAL
+            if t_hit == INF:
+                x += vx * remaining
+                y += vy * remaining
+                break
+            x += vx * t_hit
+            y += vy * t_hit
+            remaining -= t_hit
+
+            if kind == KIND_GOAL:
+                x = 0.0 if vx < 0 else float(max_x)  # Exactly on the goal line
+                break
+            if kind == KIND_WALL:
+                y = 0.0 if vy < 0 else float(max_y)  # Exactly on the wall
+                ball.vy = -vy
+                if not hit_paddle:  # Avoid double sound if hit paddle then wall instantly
+                    events |= EVENT_WALL_HIT
+                continue
+
+            # --- Paddle Collision and Response ---
+            hit_paddle = True
+            self.trajectory_id += 1
+            events |= EVENT_PADDLE_HIT
+            if kind == KIND_PLAYER_PADDLE:
+                paddle = player_paddle
+                x = player_paddle.x + player_paddle.w  # Flush with the paddle face
+                direction = 1.0  # Moving right
+            else:
+                paddle = ai_paddle
+                x = ai_paddle.x - ball.w
+                direction = -1.0  # Moving left
+            # Increase horizontal speed and send the ball back
+            new_abs_speed_x = min(abs(vx) * PADDLE_HIT_SPEED_INCREASE_FACTOR, MAX_ABS_BALL_SPEED_X)
+            ball.vx = direction * new_abs_speed_x
+            # Vertical speed depends on where the ball hit the paddle
+            normalized_delta_y = ((y + ball.h / 2) - paddle.centery) / (PADDLE_HEIGHT / 2)  # Range approx -1 to 1
+            ball_speed_y = normalized_delta_y * BALL_SPEED_Y_INITIAL * PADDLE_BOUNCE_ANGLE_FACTOR
+            if abs(ball_speed_y) > MAX_ABS_BALL_SPEED_Y:
+                ball_speed_y = math.copysign(MAX_ABS_BALL_SPEED_Y, ball_speed_y)
+            # Ensure minimum vertical speed if not zero, to prevent overly flat shots making game stall
+            elif 0 < abs(ball_speed_y) < 1.0:
+                ball_speed_y = math.copysign(1.0, ball_speed_y)
+            # If ball_speed_y is exactly 0.0 (center hit), it remains 0.0 for a straight shot
+            ball.vy = ball_speed_y
+
+        # --- Scoring ---
+        if x <= 0:  # AI scores (ball reached the left edge)
+            self.ai_score += 1
+            events |= self._point_scored(self.ai_score, "AI", serve_to_player_next=True)
+        elif x >= max_x:  # Player scores (ball reached the right edge)
+            self.player_score += 1
+            events |= self._point_scored(self.player_score, "Player", serve_to_player_next=False)
+        else:
+            ball.x = x
+            ball.y = y
+
+        # --- Player Paddle Control ---
+        player_paddle.centery = player_y
+        player_paddle.clamp_y(SCREEN_HEIGHT)
+
+        # --- AI Paddle Control ---
+        # Move toward the target at AI_PADDLE_SPEED, with a small deadzone. The simple AI targets the ball.
+        # A move never passes the target, so coarse steps don't overshoot and oscillate around it.
+        target_y = ball.centery if ai_y is None else ai_y
+        if ai_paddle.centery < target_y - AI_PADDLE_SPEED / 2:
+            ai_paddle.y += min(AI_PADDLE_SPEED * dt, target_y - ai_paddle.centery)
+        elif ai_paddle.centery > target_y + AI_PADDLE_SPEED / 2:
+            ai_paddle.y -= min(AI_PADDLE_SPEED * dt, ai_paddle.centery - target_y)
+        ai_paddle.clamp_y(SCREEN_HEIGHT)
+        self.time += dt
+
+        return events
+
+    def _point_scored(self, score, scorer, serve_to_player_next):
+        """Serves again, or ends the match if the scorer reached WINNING_SCORE. Returns the events."""
+        if score >= WINNING_SCORE:
+            self.game_over = True
+            self.winner = scorer
+            self.center_ball()  # Just center the ball visually and stop it
+            self.ball.vx = 0.0
+            self.ball.vy = 0.0
+            return EVENT_SCORE | EVENT_GAME_OVER
+        self.reset_ball(serve_to_player_next)
+        return EVENT_SCORE
+
+
+# --- Trajectory Prediction ---
+def fold_y(y, max_y):
+    """Maps an unbounded y onto [0, max_y] the way repeated wall bounces do."""
+    if max_y <= 0:
+        return 0.0
+    period = 2.0 * max_y
+    y %= period
+    return period - y if y > max_y else y
+
+
+def predict_crossing(x, y, vx, vy, plane_x, max_y):
+    """
+    Closed-form path of a ball bouncing between y = 0 and y = max_y (its top-left corner's range).
+    Returns:
+        tuple | None: (ticks until x reaches plane_x, top-left y there), or None if the ball is moving away.
+    """
+    if vx == 0:
+        return None
+    t = (plane_x - x) / vx
+    if t < 0:
+        return None
+    return t, fold_y(y + vy * t, max_y)
+
+
+class InterceptPredictor:
+    """
+    Where and when the ball will next reach one paddle's face. The result is cached against
+    PongSim.trajectory_id, so it is recomputed only after a paddle hit or serve, not every tick;
+    wall bounces are already folded into the closed form.
+    Args:
+        sim (PongSim): The match to watch.
+        paddle (Body): The paddle whose face is predicted for (sim.player_paddle or sim.ai_paddle).
+    """
+    __slots__ = ('sim', 'paddle', 'trajectory_id', 'arrival_time', 'center_y')
+
+    def __init__(self, sim, paddle):
+        self.sim = sim
+        self.paddle = paddle
+        self.trajectory_id = None
+        self.arrival_time = None
+        self.center_y = None
+
+    def query(self):
+        """
+        Returns:
+            tuple | None: (sim.time at which the ball reaches the paddle face, ball center y there),
+            or None if the ball is not heading for this paddle.
+        """
+        sim = self.sim
+        if sim.trajectory_id != self.trajectory_id:
+            ball = sim.ball
+            paddle = self.paddle
+            plane_x = paddle.x + paddle.w if paddle.x < SCREEN_WIDTH / 2 else paddle.x - ball.w
+            crossing = predict_crossing(ball.x, ball.y, ball.vx, ball.vy, plane_x, SCREEN_HEIGHT - ball.h)
+            if crossing is None:
+                self.arrival_time = self.center_y = None
+            else:
+                self.arrival_time = sim.time + crossing[0]
+                self.center_y = crossing[1] + ball.h / 2
+            self.trajectory_id = sim.trajectory_id
+        if self.arrival_time is None:
+            return None
+        return self.arrival_time, self.center_y
+
+
+# Aim error, in px, of PredictiveAI at each difficulty
+AI_DIFFICULTY_ERROR = {'easy': 70.0, 'normal': 50.0, 'hard': 30.0, 'perfect': 0.0}
+
+# Fixed layout of PredictiveAI.snapshot(): predicted trajectory id (-1 = none), arrival time and
+# center y (NaN = ball heading away), trajectory id of the aim offset (-1 = none), aim offset
+AI_STATE = struct.Struct('<qddqd')
+
+
+class PredictiveAI:
+    """
+    AI that heads for where the ball will arrive instead of chasing it. Each rally it aims
+    up to error_px off the true intercept (see AI_DIFFICULTY_ERROR), and drifts back to the
+    middle while the ball is travelling away.
+    Pass target() as the ai_y argument of PongSim.step().
+    Its cached prediction and aim are not part of the sim's snapshot; snapshot() and restore()
+    carry them, so a match resumed from both plays on exactly as it would have.
+    Args:
+        sim (PongSim): The match to play.
+        difficulty (str): A key of AI_DIFFICULTY_ERROR.
+        rng (SplitMixRandom | None): Source of the aim error; None uses sim.rng.
+        paddle (Body | None): The paddle to steer; None is sim.ai_paddle.
+    """
+    __slots__ = ('predictor', 'difficulty', 'error_px', 'rng', 'offset', 'offset_trajectory')
+
+    def __init__(self, sim, difficulty='normal', rng=None, paddle=None):
+        self.predictor = InterceptPredictor(sim, sim.ai_paddle if paddle is None else paddle)
+        self.difficulty = difficulty
+        self.error_px = AI_DIFFICULTY_ERROR[difficulty]
+        self.rng = rng  # None draws from the match's own RNG, keeping replays deterministic
+        self.offset = 0.0
+        self.offset_trajectory = None
+
+    def target(self):
+        """Center y the AI paddle should move toward this tick."""
+        intercept = self.predictor.query()
+        if intercept is None:
+            return SCREEN_HEIGHT / 2
+        if self.offset_trajectory != self.predictor.trajectory_id:
+            rng = self.rng if self.rng is not None else self.predictor.sim.rng
+            self.offset = rng.uniform(-self.error_px, self.error_px) if self.error_px else 0.0
+            self.offset_trajectory = self.predictor.trajectory_id
+        return intercept[1] + self.offset
+
+    def snapshot(self):
+        """Returns the prediction cache and aim as an AI_STATE.size-byte record."""
+        predictor = self.predictor
+        trajectory_id = -1 if predictor.trajectory_id is None else predictor.trajectory_id
+        if predictor.arrival_time is None:
+            arrival_time = center_y = math.nan
+        else:
+            arrival_time, center_y = predictor.arrival_time, predictor.center_y
+        offset_trajectory = -1 if self.offset_trajectory is None else self.offset_trajectory
+        return AI_STATE.pack(trajectory_id, arrival_time, center_y, offset_trajectory, self.offset)
+
+    def restore(self, data, offset=0):
+        """Loads a record written by snapshot() from any bytes-like object at offset."""
+        trajectory_id, arrival_time, center_y, offset_trajectory, self.offset = AI_STATE.unpack_from(data, offset)
+        predictor = self.predictor
+        predictor.trajectory_id = None if trajectory_id < 0 else trajectory_id
+        if math.isnan(arrival_time):
+            predictor.arrival_time = predictor.center_y = None
+        else:
+            predictor.arrival_time, predictor.center_y = arrival_time, center_y
+        self.offset_trajectory = None if offset_trajectory < 0 else offset_trajectory
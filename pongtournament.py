@@ -0,0 +1,226 @@
+"""
+Headless AI tournaments for Ultra!Pong HDR.
+
+Plays many matches between AI policies on a process pool and rates the policies with Elo.
+Every pair of policies plays the same number of matches, with sides swapped every other
+match. Matches are sent to the workers in chunks, and results are folded into the rating
+table as chunks come back. Each match is seeded, so a tournament with the same seed and
+arguments gives the same table no matter how many workers run it.
+
+    python pongtournament.py --policies follow predictive-normal predictive-hard --matches 1000
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pongsim import (PongSim, PredictiveAI, SplitMixRandom, AI_DIFFICULTY_ERROR, AI_PADDLE_SPEED,
+                     SCREEN_HEIGHT, TICK_RATE)
+
+MAX_MATCH_TICKS = 10 * 60 * TICK_RATE  # A match still running after 10 minutes of game time is scored as it stands
+ELO_START = 1500.0
+ELO_K = 16.0
+DEFAULT_CHUNK_SIZE = 64  # Matches per task sent to a worker
+
+
+# --- Policies ---
+# A policy factory takes (sim, paddle) and returns a function giving the center y that
+# paddle should move toward this tick.
+def follow_ball_policy(sim, paddle):
+    """The original AI: chase the ball's current height."""
+    ball = sim.ball
+    return lambda: ball.centery
+
+
+def _predictive_policy(difficulty):
+    def factory(sim, paddle):
+        return PredictiveAI(sim, difficulty, paddle=paddle).target
+    return factory
+
+
+def center_policy(sim, paddle):
+    """Stays in the middle; a floor for the ratings."""
+    return lambda: SCREEN_HEIGHT / 2
+
+
+POLICIES = {
+    'follow': follow_ball_policy,
+    'center': center_policy,
+}
+for _difficulty in AI_DIFFICULTY_ERROR:
+    POLICIES['predictive-' + _difficulty] = _predictive_policy(_difficulty)
+
+
+def play_match(left, right, seed, max_ticks=MAX_MATCH_TICKS, dt=1.0):
+    """
+    Plays one match between two policies. Both paddles move at AI_PADDLE_SPEED, like the AI paddle in a normal game.
+    Args:
+        left (str): Policy name for the left (player) paddle.
+        right (str): Policy name for the right (AI) paddle.
+        seed (int): 32-bit match seed.
+        max_ticks (float): Game time after which the match is stopped and scored as it stands.
+        dt (float): Ticks per step.
+    Returns:
+        tuple: (left score, right score, ticks played)
+    """
+    sim = PongSim(seed)
+    sim.reset_game(seed)
+    left_target = POLICIES[left](sim, sim.player_paddle)
+    right_target = POLICIES[right](sim, sim.ai_paddle)
+    paddle = sim.player_paddle
+    step = sim.step
+    deadzone = AI_PADDLE_SPEED / 2
+    move = AI_PADDLE_SPEED * dt
+    while not sim.game_over and sim.time < max_ticks:
+        # step() places the player paddle wherever asked, so apply the AI paddle's speed limit here
+        target_y = left_target()
+        player_y = paddle.centery
+        if player_y < target_y - deadzone:
+            player_y += min(move, target_y - player_y)
+        elif player_y > target_y + deadzone:
+            player_y -= min(move, player_y - target_y)
+        step(player_y, right_target(), dt)
+    return sim.player_score, sim.ai_score, sim.time
+
+
+def _play_chunk(matches, max_ticks):
+    """Worker task: plays (match id, left, right, seed) tuples and returns (match id, left score, right score, ticks)."""
+    return [(match_id, *play_match(left, right, seed, max_ticks)) for match_id, left, right, seed in matches]
+
+
+def schedule(policies, matches_per_pair, seed=0):
+    """
+    Round-robin fixtures: matches_per_pair matches for every pair of policies, with sides alternating.
+    Returns:
+        list: (match id, left policy, right policy, match seed) tuples.
+    """
+    rng = SplitMixRandom(seed)
+    fixtures = []
+    for i, first in enumerate(policies):
+        for second in policies[i + 1:]:
+            for n in range(matches_per_pair):
+                left, right = (first, second) if n % 2 == 0 else (second, first)
+                fixtures.append((len(fixtures), left, right, rng.getrandbits(32)))
+    return fixtures
+
+
+class EloTable:
+    """
+    Elo ratings plus win/draw/loss counts. A match counts as one game; the winner of a match
+    cut short at max_ticks is whoever leads, and a tie is a draw.
+    """
+
+    def __init__(self, policies, k=ELO_K, start=ELO_START):
+        self.k = k
+        self.ratings = {name: start for name in policies}
+        self.records = {name: [0, 0, 0] for name in policies}  # Wins, draws, losses
+
+    def expected(self, a, b):
+        """Expected score of a against b."""
+        return 1.0 / (1.0 + 10.0 ** ((self.ratings[b] - self.ratings[a]) / 400.0))
+
+    def update(self, a, b, score_a):
+        """Records one game; score_a is 1 for a win by a, 0.5 for a draw, 0 for a loss."""
+        delta = self.k * (score_a - self.expected(a, b))
+        self.ratings[a] += delta
+        self.ratings[b] -= delta
+        outcome = 0 if score_a == 1 else 1 if score_a == 0.5 else 2
+        self.records[a][outcome] += 1
+        self.records[b][2 - outcome] += 1
+
+    def format(self):
+        """The table as text, best rating first."""
+        lines = [f"{'policy':<20} {'elo':>7} {'W':>7} {'D':>7} {'L':>7}"]
+        for name in sorted(self.ratings, key=self.ratings.get, reverse=True):
+            wins, draws, losses = self.records[name]
+            lines.append(f"{name:<20} {self.ratings[name]:7.1f} {wins:7d} {draws:7d} {losses:7d}")
+        return "\n".join(lines)
+
+
+def run_tournament(policies, matches_per_pair, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, seed=0,
+                   max_ticks=MAX_MATCH_TICKS, on_result=None):
+    """
+    Plays a round-robin tournament on a process pool.
+    Results are applied to the table in fixture order as they arrive, so the ratings do not
+    depend on which worker finishes first.
+    Args:
+        policies (list): Names from POLICIES.
+        matches_per_pair (int): Matches played by every pair of policies.
+        workers (int | None): Worker processes; None uses os.cpu_count(), 0 plays in this process.
+        chunk_size (int): Matches per worker task.
+        seed (int): Seeds the match seeds.
+        max_ticks (float): See play_match().
+        on_result (callable | None): Called with (fixture, left score, right score, ticks) for every match.
+    Returns:
+        EloTable: The final ratings.
+    """
+    for name in policies:
+        if name not in POLICIES:
+            raise ValueError(f"unknown policy {name!r}; choose from {', '.join(POLICIES)}")
+    fixtures = schedule(policies, matches_per_pair, seed)
+    table = EloTable(policies)
+    chunks = [fixtures[i:i + chunk_size] for i in range(0, len(fixtures), chunk_size)]
+
+    def apply(results):
+        for match_id, left_score, right_score, ticks in results:
+            _, left, right, _ = fixture = fixtures[match_id]
+            score = 1.0 if left_score > right_score else 0.0 if left_score < right_score else 0.5
+            table.update(left, right, score)
+            if on_result is not None:
+                on_result(fixture, left_score, right_score, ticks)
+
+    if workers == 0:
+        for chunk in chunks:
+            apply(_play_chunk(chunk, max_ticks))
+        return table
+
+    pending = {}  # Chunk index -> results that arrived before an earlier chunk
+    next_chunk = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_play_chunk, chunk, max_ticks): i for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            pending[futures[future]] = future.result()
+            while next_chunk in pending:
+                apply(pending.pop(next_chunk))
+                next_chunk += 1
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate Pong AI policies by playing them against each other.")
+    parser.add_argument('--policies', nargs='+', default=['follow', 'predictive-normal'], choices=sorted(POLICIES),
+                        help="policies to enter (default: follow predictive-normal)")
+    parser.add_argument('--matches', type=int, default=200, help="matches per pair of policies (default: 200)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count; 0 = no pool)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="matches per worker task")
+    parser.add_argument('--seed', type=int, default=0, help="tournament seed")
+    parser.add_argument('--max-ticks', type=float, default=MAX_MATCH_TICKS, help="game time limit per match, in ticks")
+    args = parser.parse_args(argv)
+    if len(args.policies) < 2:
+        parser.error("need at least two policies")
+
+    total = len(args.policies) * (len(args.policies) - 1) // 2 * args.matches
+    done = 0
+    last_report = time.perf_counter()
+
+    def progress(fixture, left_score, right_score, ticks):
+        nonlocal done, last_report
+        done += 1
+        now = time.perf_counter()
+        if now - last_report >= 1.0 or done == total:
+            print(f"\r{done}/{total} matches", end="", file=sys.stderr, flush=True)
+            last_report = now
+
+    start = time.perf_counter()
+    table = run_tournament(args.policies, args.matches, args.workers, args.chunk_size, args.seed,
+                           args.max_ticks, on_result=progress)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+    print(table.format())
+    workers = os.cpu_count() if args.workers is None else args.workers
+    print(f"{total} matches in {elapsed:.1f} s " + (f"on {workers} workers" if workers else "in-process"))
+
+
+if __name__ == "__main__":
+    main()